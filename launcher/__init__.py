@@ -0,0 +1 @@
+"""Proot-Nour launcher package; see launcher.core."""
@@ -0,0 +1,3 @@
+from launcher.core import main
+
+main()
@@ -0,0 +1,418 @@
+"""Benchmark launcher boots offline against a local stand-in for GitHub.
+
+    python -m launcher.bench [--latency S] [--bandwidth B] [--error-rate P]
+                             [--uplink B] [--max-concurrent N] [--storm N]
+                             [--drop-after B] [--stall S] [--stall-after B]
+                             [--size B] [--runs N] [--output FILE] [launcher ...]
+
+A threaded HTTP server on 127.0.0.1 serves nour.sh, the egg scripts and
+generated artifacts for every URL the launcher asks for, with per-request
+latency, a bandwidth cap, random 503s, ETag / Last-Modified revalidation and
+Range / If-Range requests. --drop-after closes the connection after that many
+body bytes of every response, so downloads only finish by resuming. --stall
+makes every response go silent for that many seconds after --stall-after body
+bytes, and a tiny --bandwidth makes the server trickle; both exercise the
+launcher's read timeouts and boot deadline.
+--uplink caps the bytes per second of all responses together, like a node's
+shared uplink, and --max-concurrent answers 429 to requests beyond that many
+in flight, like GitHub's rate limiting.
+Each launcher (app.py, nourd.py and nrnet.py by default) is booted with
+NOUR_ORIGIN_OVERRIDE pointing at it, in three scenarios:
+
+    cold       empty server home
+    warm       same home, update checks still fresh (no requests expected)
+    unchanged  same home, update TTL 0, so every artifact is revalidated
+
+With --storm N, N empty homes are also booted at once, as after a node
+reboot, both uncoordinated (storm) and through a shared download governor
+directory (storm-governed); for these the time until the last boot finished
+is reported as well.
+
+For every boot the boot profile supplies the time to child start and the
+launcher's request and byte counts, and the server counts what it served.
+nour.sh is the repository's own, run against stub egg scripts, and every
+program exec'd below the launcher, nour.sh included, is counted as a spawn
+by polling /proc. Results are printed and written as JSON
+(bench-results.json by default) for comparison across releases.
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCHERS = ["app.py", "nourd.py", "nrnet.py"]
+SCENARIOS = ["cold", "warm", "unchanged"]
+OUTPUT = "bench-results.json"
+RESULTS_VERSION = 3
+LAST_MODIFIED = "Thu, 01 Jan 2026 00:00:00 GMT"
+PUBLIC_IP = "93.184.216.34"
+THROTTLE_SLICE = 0.05
+SPAWN_POLL_INTERVAL = 0.0005
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serves /<host>/<path> with content generated from the path."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    bandwidth = 0
+    error_rate = 0.0
+    uplink = 0
+    max_concurrent = 0
+    drop_after = 0
+    stall = 0.0
+    stall_after = 0
+    artifact_size = 1024 * 1024
+    stats = {"requests": 0, "not_modified": 0, "errors": 0, "rate_limited": 0, "partial": 0, "dropped": 0, "stalled": 0,
+             "bytes": 0}
+    stats_lock = threading.Lock()
+    # Shared by every response: requests in flight and the uplink's debt (seconds of sending already promised).
+    state = {"in_flight": 0, "uplink_free_at": 0.0}
+
+    def count(self, **amounts) -> None:
+        with self.stats_lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def do_GET(self):
+        self.count(requests=1)
+        with self.stats_lock:
+            self.state["in_flight"] += 1
+            limited = self.max_concurrent and self.state["in_flight"] > self.max_concurrent
+        try:
+            if limited:
+                self.count(rate_limited=1)
+                self.send_response(429)
+                self.send_header("Content-Length", "0")
+                self.send_header("Retry-After", "1")
+                self.end_headers()
+                return
+            self.respond()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # the client gave up on a stalled or trickling response
+        finally:
+            with self.stats_lock:
+                self.state["in_flight"] -= 1
+
+    def respond(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.count(errors=1)
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        body = artifact_content(self.path.split("?", 1)[0], self.artifact_size)
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag or (
+                not self.headers.get("If-None-Match") and self.headers.get("If-Modified-Since") == LAST_MODIFIED):
+            self.count(not_modified=1)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start, end = 0, len(body)
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes=") and self.headers.get("If-Range", etag) in (etag, LAST_MODIFIED):
+            first, _, last = byte_range[len("bytes="):].partition("-")
+            start, end = int(first), min(len(body), int(last) + 1 if last else len(body))
+            if start >= end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.count(partial=1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        self.write_throttled(body[start:end])
+
+    def write_throttled(self, body: bytes) -> None:
+        limit = min(len(body), self.drop_after) if self.drop_after else len(body)
+        step = max(1, int(self.bandwidth * THROTTLE_SLICE)) if self.bandwidth else limit or 1
+        stall_at = self.stall_after if self.stall else None
+        offset = 0
+        while offset < limit:
+            if stall_at is not None and offset >= stall_at:
+                # Go silent mid-body, like a stalled server or a dead path.
+                stall_at = None
+                self.wfile.flush()
+                self.count(stalled=1)
+                time.sleep(self.stall)
+            started = time.monotonic()
+            sent = min(step, limit - offset) if stall_at is None else min(step, limit - offset, stall_at - offset)
+            self.wfile.write(body[offset:offset + sent])
+            offset += sent
+            self.count(bytes=sent)
+            if self.bandwidth:
+                time.sleep(max(0.0, THROTTLE_SLICE - (time.monotonic() - started)))
+            if self.uplink:
+                with self.stats_lock:
+                    free_at = max(time.monotonic(), self.state["uplink_free_at"]) + sent / self.uplink
+                    self.state["uplink_free_at"] = free_at
+                time.sleep(max(0.0, free_at - time.monotonic()))
+        if limit < len(body):
+            # Cut the body short; the client sees the connection close before Content-Length.
+            self.count(dropped=1)
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def artifact_content(path: str, size: int) -> bytes:
+    # nour.sh is the real one; the egg scripts it starts are tiny no-ops so the
+    # child exits at once, public-IP endpoints (a bare host or .../ip) answer
+    # with an address; anything else is size bytes of repeatable filler
+    # standing in for a binary.
+    name = os.path.basename(path)
+    if "/" not in path.strip("/") or name == "ip":
+        return PUBLIC_IP.encode('utf-8')
+    if name == "nour.sh":
+        with open(os.path.join(REPO_DIR, "nour.sh"), 'rb') as f:
+            return f.read()
+    if name.endswith(".sh"):
+        return b"#!/bin/sh\nexit 0\n"
+    if name.endswith(".py"):
+        return b"#!/usr/bin/env python3\n"
+    seed = hashlib.sha256(path.encode('utf-8')).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+def start_server(latency: float, bandwidth: int, error_rate: float, size: int,
+                 uplink: int = 0, max_concurrent: int = 0, drop_after: int = 0, stall: float = 0.0,
+                 stall_after: int = 0) -> http.server.ThreadingHTTPServer:
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {
+        "latency": latency,
+        "bandwidth": bandwidth,
+        "error_rate": error_rate,
+        "uplink": uplink,
+        "max_concurrent": max_concurrent,
+        "drop_after": drop_after,
+        "stall": stall,
+        "stall_after": stall_after,
+        "artifact_size": size,
+        "stats": dict.fromkeys(StandInHandler.stats, 0),
+        "state": dict(StandInHandler.state),
+    })
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def boot(launcher: str, home: str, origin: str, server, extra_env: dict) -> dict:
+    """Boot launcher once in home and return its measurements."""
+    report_path = os.path.join(home, ".bench-profile.json")
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    env = dict(os.environ, NOUR_ORIGIN_OVERRIDE=origin, NOUR_PROFILE="1", NOUR_PROFILE_REPORT=report_path,
+               NOUR_LOG_LEVEL="quiet")
+    env.pop("NOUR_MIRRORS", None)
+    env.pop("NOUR_SHARED_STORE", None)
+    env.setdefault("NOUR_GOVERNOR_DIR", "")
+    env.update(extra_env)
+    with server.RequestHandlerClass.stats_lock:
+        served_before = dict(server.RequestHandlerClass.stats)
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, launcher)], cwd=home, env=env,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    counter = SpawnCounter(process.pid)
+    _, stderr = process.communicate()
+    wall = time.monotonic() - started
+    spawns = counter.stop()
+    with server.RequestHandlerClass.stats_lock:
+        served = {name: value - served_before[name] for name, value in server.RequestHandlerClass.stats.items()}
+
+    result = {"exit_code": process.returncode, "wall_seconds": round(wall, 4), "spawns": spawns, "served": served}
+    try:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        result["boot_seconds"] = round(report["marks"]["child_start"], 4)
+        result["requests"] = report["totals"]["requests"]
+        result["bytes_received"] = report["totals"]["bytes_received"]
+        result["throttled_seconds"] = report["metrics"].get("throttled_seconds", 0)
+    except (OSError, ValueError, KeyError):
+        result["error"] = stderr.decode('utf-8', 'replace')[-2000:] or "no boot profile written"
+    return result
+
+class SpawnCounter:
+    """Count the programs exec'd below pid by polling /proc on a background thread.
+
+    Every (pid, start time, command) seen in the tree counts once, except a
+    process still running its parent's command: a fork that has not exec'd
+    (yet), or a shell's subshell. pid's own exec of the script in handoff
+    mode counts too. A program that starts and exits between two polls is
+    missed, and so is one running the same command as its parent, so the
+    count is a lower bound.
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.seen = set()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="spawn-counter", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while True:
+            self.poll()
+            if self.stopping.wait(SPAWN_POLL_INTERVAL):
+                return
+
+    def poll(self) -> None:
+        # Walk down from pid through every thread's children list; far cheaper than scanning all of /proc.
+        pending = [(self.pid, None)]
+        while pending:
+            pid, parent_name = pending.pop()
+            try:
+                with open(f"/proc/{pid}/stat", 'rb') as f:
+                    stat = f.read()
+                name = stat[stat.find(b"(") + 1:stat.rfind(b")")]
+                if name != parent_name:
+                    self.seen.add((pid, stat.rsplit(b")", 1)[1].split()[19], name))
+                for task in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{task}/children", 'rb') as f:
+                        pending.extend((int(child), name) for child in f.read().split())
+            except (OSError, ValueError, IndexError):
+                continue
+
+    def stop(self) -> int:
+        """Stop polling and return the spawns seen, not counting the launcher itself."""
+        self.stopping.set()
+        self.thread.join()
+        return max(0, len(self.seen) - 1)
+
+def summarize(runs: list[dict]) -> dict:
+    summary = {}
+    for metric in ("boot_seconds", "wall_seconds", "requests", "bytes_received", "spawns", "throttled_seconds"):
+        values = [run[metric] for run in runs if metric in run]
+        if values:
+            summary[metric] = statistics.median(values)
+    summary["failures"] = sum(1 for run in runs if run["exit_code"] != 0 or "error" in run)
+    return summary
+
+def boot_storm(launcher: str, count: int, origin: str, server, governed: bool) -> dict:
+    """Boot count empty homes at once; with governed, they share one governor directory."""
+    root = tempfile.mkdtemp(prefix="nour-storm-")
+    extra_env = {"NOUR_GOVERNOR_DIR": os.path.join(root, "governor") if governed else ""}
+    runs = [None] * count
+
+    def run(index: int) -> None:
+        home = os.path.join(root, f"home-{index}")
+        os.mkdir(home)
+        runs[index] = boot(launcher, home, origin, server, extra_env)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return {"completion_seconds": round(time.monotonic() - started, 4), "boots": runs}
+
+def run_benchmark(launchers: list[str], runs: int, latency: float, bandwidth: int, error_rate: float, size: int,
+                  uplink: int = 0, max_concurrent: int = 0, storm: int = 0, drop_after: int = 0,
+                  stall: float = 0.0, stall_after: int = 0) -> dict:
+    server = start_server(latency, bandwidth, error_rate, size, uplink, max_concurrent, drop_after, stall, stall_after)
+    origin = f"http://127.0.0.1:{server.server_address[1]}"
+    scenarios = SCENARIOS + (["storm", "storm-governed"] if storm > 0 else [])
+    results = []
+    try:
+        for launcher in launchers:
+            samples = {scenario: [] for scenario in scenarios}
+            storms = {"storm": [], "storm-governed": []}
+            for _ in range(runs):
+                home = tempfile.mkdtemp(prefix="nour-bench-")
+                try:
+                    samples["cold"].append(boot(launcher, home, origin, server, {}))
+                    samples["warm"].append(boot(launcher, home, origin, server, {}))
+                    samples["unchanged"].append(boot(launcher, home, origin, server, {"NOUR_UPDATE_TTL": "0"}))
+                finally:
+                    shutil.rmtree(home, ignore_errors=True)
+                if storm > 0:
+                    for scenario in storms:
+                        storms[scenario].append(boot_storm(launcher, storm, origin, server, scenario == "storm-governed"))
+                        samples[scenario].extend(storms[scenario][-1]["boots"])
+            for scenario in scenarios:
+                result = {"launcher": launcher, "scenario": scenario,
+                          "median": summarize(samples[scenario]), "runs": samples[scenario]}
+                if scenario in storms:
+                    result["median"]["completion_seconds"] = statistics.median(
+                        run["completion_seconds"] for run in storms[scenario])
+                results.append(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"runs": runs, "latency": latency, "bandwidth": bandwidth, "error_rate": error_rate,
+                   "uplink": uplink, "max_concurrent": max_concurrent, "storm": storm, "drop_after": drop_after,
+                   "stall": stall, "stall_after": stall_after, "artifact_size": size},
+        "results": results,
+    }
+
+def print_table(benchmark: dict) -> None:
+    print(f"{'launcher':<10} {'scenario':<14} {'boot s':>8} {'wall s':>8} {'reqs':>5} {'bytes':>10} {'spawns':>6} "
+          f"{'thr s':>6} {'fail':>4} {'storm s':>8}")
+    for result in benchmark["results"]:
+        median = result["median"]
+        completion = f"{median['completion_seconds']:>8.3f}" if "completion_seconds" in median else ""
+        print(f"{result['launcher']:<10} {result['scenario']:<14} {median.get('boot_seconds', float('nan')):>8.3f} "
+              f"{median.get('wall_seconds', float('nan')):>8.3f} {median.get('requests', 0):>5.0f} "
+              f"{median.get('bytes_received', 0):>10.0f} {median.get('spawns', 0):>6.0f} "
+              f"{median.get('throttled_seconds', 0):>6.2f} {median['failures']:>4} {completion}")
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m launcher.bench", description="Benchmark launcher boots offline.")
+    parser.add_argument("launchers", nargs="*", default=LAUNCHERS, help="launcher scripts, relative to the repository")
+    parser.add_argument("--runs", type=int, default=3, help="boots per launcher and scenario (median is reported)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added before every response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second per response, 0 for unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--uplink", type=int, default=0, help="bytes per second of all responses together, 0 for unlimited")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="requests in flight beyond which the server answers 429, 0 for no limit")
+    parser.add_argument("--storm", type=int, default=0, help="also boot this many empty homes at once")
+    parser.add_argument("--drop-after", type=int, default=0,
+                        help="close the connection after this many body bytes of every response, 0 never")
+    parser.add_argument("--stall", type=float, default=0.0, help="seconds every response goes silent mid-body")
+    parser.add_argument("--stall-after", type=int, default=64 * 1024, help="body bytes sent before the stall")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="size of each generated binary artifact")
+    parser.add_argument("--output", default=OUTPUT, help="JSON results file")
+    args = parser.parse_args(argv)
+
+    benchmark = run_benchmark(args.launchers, args.runs, args.latency, args.bandwidth, args.error_rate, args.size,
+                              args.uplink, args.max_concurrent, args.storm, args.drop_after, args.stall,
+                              args.stall_after)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(benchmark, f, indent=1)
+    print_table(benchmark)
+    print(f"Wrote {args.output}")
+    return 1 if any(result["median"]["failures"] for result in benchmark["results"]) else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
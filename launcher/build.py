@@ -0,0 +1,53 @@
+"""Build nour.pyz, the launcher package as a zipapp with precompiled bytecode.
+
+    python -m launcher.build [output]
+
+Each module is stored as source plus an unchecked hash-based .pyc, so the
+interpreter it was built with skips compilation entirely and any other
+version falls back to the bundled source. Entries carry a fixed timestamp,
+which keeps rebuilds of unchanged sources byte-identical.
+"""
+import io
+import os
+import sys
+import tempfile
+import py_compile
+import zipfile
+
+PACKAGE = "launcher"
+OUTPUT = "nour.pyz"
+ENTRY_POINT = "from launcher.core import main\n\nmain()\n"
+MODULES = ["__init__.py", "core.py", "pool.py"]
+ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+INTERPRETER = b"#!/usr/bin/env python3\n"
+
+def build(output: str = OUTPUT) -> str:
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive, \
+            tempfile.TemporaryDirectory() as scratch:
+        write_entry(archive, "__main__.py", ENTRY_POINT.encode('utf-8'))
+        for module in MODULES:
+            source = os.path.join(package_dir, module)
+            compiled = os.path.join(scratch, module + "c")
+            py_compile.compile(source, cfile=compiled, dfile=f"{PACKAGE}/{module}", doraise=True,
+                               invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+            with open(source, 'rb') as f:
+                write_entry(archive, f"{PACKAGE}/{module}", f.read())
+            with open(compiled, 'rb') as f:
+                write_entry(archive, f"{PACKAGE}/{module}c", f.read())
+    temp_output = output + ".tmp"
+    with open(temp_output, 'wb') as f:
+        f.write(INTERPRETER + buffer.getvalue())
+    os.chmod(temp_output, 0o755)
+    os.replace(temp_output, output)
+    return output
+
+def write_entry(archive: zipfile.ZipFile, name: str, data: bytes) -> None:
+    info = zipfile.ZipInfo(name, ZIP_TIMESTAMP)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    archive.writestr(info, data)
+
+if __name__ == "__main__":
+    print(f"Built {build(sys.argv[1] if len(sys.argv) > 1 else OUTPUT)}")
@@ -0,0 +1,3034 @@
+"""Proot-Nour launcher shared by app.py, nourd.py, nrnet.py and nour.pyz.
+
+Only cheap modules are imported here. The network stack (launcher.pool,
+ssl, http.client, urllib), the pump's terminal modules and the file
+helpers (tempfile, shutil, hashlib) are imported by the functions that
+use them, so a boot that never touches the network never pays for them.
+"""
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+ENV_WARNINGS = []
+
+def env_number(name: str, default, kind=float):
+    """Numeric setting from environment variable name, or default if it is unset.
+
+    An unparsable value falls back to default too; the warning is kept in
+    ENV_WARNINGS and logged once main has configured the log, since these
+    settings are read at import time, before the panel's "Done" line.
+    """
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        ENV_WARNINGS.append(f"Invalid {name} '{value}', using {default}.")
+        return default
+
+NOUR_SCRIPT_NAME = "nour.sh"
+NOUR_URL = "https://raw.githubusercontent.com/xXGAN2Xx/Proot-Nour/refs/heads/main/nour.sh"
+CACHE_DIR = ".nour-cache"
+# Optional node-wide store shared by every server home: blobs, partial downloads
+# and locks move there, and its index lets one server's fetch serve all others.
+SHARED_STORE = os.environ.get("NOUR_SHARED_STORE", "")
+STORE_DIR = SHARED_STORE or CACHE_DIR
+CACHE_BLOBS_DIR = os.path.join(STORE_DIR, "blobs")
+CACHE_MANIFEST = os.path.join(CACHE_DIR, "manifest.json")
+CACHE_PARTIAL_DIR = os.path.join(STORE_DIR, "partial")
+CACHE_LOCKS_DIR = os.path.join(STORE_DIR, "locks")
+SHARED_INDEX = os.path.join(STORE_DIR, "index.json")
+SHARED_INDEX_LOCK = os.path.join(STORE_DIR, "index.lock")
+SHARED_FIELDS = ("digest", "size", "etag", "last_modified", "validators", "fetched_at", "checked_at", "check_ok")
+FICLONE = 0x40049409
+# Downloads by every launcher on the node are governed together through the
+# files in GOVERNOR_DIR (the shared store's "governor" directory by default;
+# empty disables): at most NODE_DOWNLOADS transfers at once, NODE_BANDWIDTH
+# bytes per second between them (0 for no cap), and optionally a random pause
+# of up to START_JITTER seconds before a boot's first request, so that a node
+# reboot does not start every container's requests in the same instant. The
+# pause is off by default since every boot pays it, even a lone restart.
+GOVERNOR_DIR = os.environ.get("NOUR_GOVERNOR_DIR", os.path.join(SHARED_STORE, "governor") if SHARED_STORE else "")
+NODE_DOWNLOADS = env_number("NOUR_NODE_DOWNLOADS", 4, int)
+NODE_BANDWIDTH = env_number("NOUR_NODE_BANDWIDTH", 0, int)
+NODE_BURST_SECONDS = 0.5
+START_JITTER = env_number("NOUR_START_JITTER", 0.0)
+GOVERNOR_POLL_INTERVAL = 0.05
+CACHE_STAGED_DIR = os.path.join(CACHE_DIR, "staged")
+COPY_BUFSIZE = 64 * 1024
+USER_AGENT = "Proot-Nour-launcher"
+RESUME_ATTEMPTS = 5
+DOWNLOAD_SEGMENTS = env_number("NOUR_DOWNLOAD_SEGMENTS", 1, int)
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+PROFILE_ENV = "NOUR_PROFILE"
+PROFILE_REPORT = os.environ.get("NOUR_PROFILE_REPORT", os.path.join(CACHE_DIR, "boot-profile.json"))
+# Console verbosity: "quiet" prints one summary line per boot plus warnings and
+# errors, "debug" adds tracebacks and per-file detail. NOUR_LOG_FILE receives
+# every message, whatever the level, as JSON lines.
+LOG_LEVEL = os.environ.get("NOUR_LOG_LEVEL", "normal")
+LOG_FILE = os.environ.get("NOUR_LOG_FILE", "")
+LOG_FLUSH_INTERVAL = 0.2
+LOG_BUFFER_LIMIT = 8 * 1024
+MANIFEST_LOCK = threading.Lock()
+UPDATE_TTL = env_number("NOUR_UPDATE_TTL", 300.0)
+UPDATE_RETRY_TTL = 60.0
+UPDATE_LOCK_TIMEOUT = 30.0
+CONNECT_TIMEOUT = env_number("NOUR_CONNECT_TIMEOUT", 10.0)
+READ_TIMEOUT = env_number("NOUR_READ_TIMEOUT", 30.0)
+# Network work before the script starts must finish within this many seconds; 0 disables.
+BOOT_DEADLINE = env_number("NOUR_BOOT_DEADLINE", 120.0)
+RETRY_ATTEMPTS = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+MIRROR_STATS = os.path.join(CACHE_DIR, "mirrors.json")
+MIRROR_LOCK = threading.Lock()
+# Comma-separated mirror bases tried alongside each artifact's own URL when it
+# is not cached yet (update checks only ask the URL itself). A base serves
+# https://host/path as <base>/host/path; "jsdelivr" mirrors GitHub raw files
+# through cdn.jsdelivr.net. A base ending in "#xz" serves xz-compressed
+# variants instead, as <base>/host/path.xz.
+MIRRORS = [base.strip() for base in os.environ.get("NOUR_MIRRORS", "").split(",") if base.strip()]
+# Sends every request to this base instead, laid out like a mirror; launcher.bench
+# uses it to boot against a local stand-in server.
+ORIGIN_OVERRIDE = os.environ.get("NOUR_ORIGIN_OVERRIDE", "")
+HEDGE_DELAY = env_number("NOUR_HEDGE_DELAY", 1.0)
+HEDGE_MIN_DELAY = 0.2
+MIRROR_FAILURE_PENALTY = 10.0
+# Content-Encodings offered on full downloads, when their decoder is available.
+CONTENT_ENCODINGS = ("zstd", "br", "gzip")
+ACCEPT_ENCODING = None
+
+LOCAL_BIN = os.path.join(".local", "bin")
+USR_LOCAL_BIN = os.path.join("usr", "local", "bin")
+DEP_FLAG = ".deps"
+BOOT_TREE_ENV = "NOUR_BOOT_TREE_READY"
+NATIVE_BOOT = os.environ.get("NOUR_NATIVE_BOOT", "") not in ("", "0")
+ENTRYPOINT = "entrypoint.sh"
+SERVER_JAR = "server.jar"
+# server_ip is worked out once per boot, in the background while the boot tree
+# is prepared: an explicit variable, then a cached result younger than
+# PUBLIC_IP_TTL, then local addresses, and only then one parallel query of
+# every PUBLIC_IP_URLS endpoint bounded by PUBLIC_IP_TIMEOUT.
+PUBLIC_IP_URLS = ["http://api.ipify.org", "http://checkip.pterodactyl-installer.se",
+                  "http://icanhazip.com", "http://ifconfig.me/ip"]
+PUBLIC_IP_ENV = ("NOUR_SERVER_IP", "server_ip", "SERVER_IP")
+PUBLIC_IP_CACHE = os.path.join(CACHE_DIR, "public-ip.json")
+PUBLIC_IP_TTL = env_number("NOUR_IP_TTL", 6 * 3600.0)
+PUBLIC_IP_RETRY_TTL = 300.0
+PUBLIC_IP_TIMEOUT = 3.0
+SERVER_IP_THREAD = None
+SERVER_IP = None
+HANDOFF_MODE = os.environ.get("NOUR_HANDOFF", "")
+UPDATE_MODE = os.environ.get("NOUR_UPDATE_MODE", "")
+# Restart policy for the script: "no", "on-failure" or "always". Restarts reuse
+# the prepared boot tree and run immediately, then back off exponentially while
+# the script keeps dying within RESTART_RESET_AFTER seconds; RESTART_MAX such
+# restarts in a row (0 for no limit) end the crash loop.
+RESTART_POLICY = os.environ.get("NOUR_RESTART", "no")
+RESTART_MAX = env_number("NOUR_RESTART_MAX", 5, int)
+RESTART_BASE_DELAY = 1.0
+RESTART_MAX_DELAY = 60.0
+RESTART_RESET_AFTER = 60.0
+FETCH_WORKERS = env_number("NOUR_FETCH_WORKERS", 6, int)
+# The boot set is installed as a versioned directory per resolved set of
+# artifacts; the files in the server home are symlinks through the "current"
+# link, which moves in one rename once a whole set is in place. The last
+# VERSIONS_KEEP activations younger than VERSIONS_MAX_AGE are kept for
+# rollback with --activate=previous (or an id); --activate=latest unpins.
+VERSIONS_DIR = ".nour-versions"
+VERSIONS_CURRENT = os.path.join(VERSIONS_DIR, "current")
+VERSIONS_STATE = os.path.join(VERSIONS_DIR, "state.json")
+VERSIONS_INCOMING = os.path.join(VERSIONS_DIR, "incoming")
+VERSIONS_LOCK = os.path.join(VERSIONS_DIR, "lock")
+VERSION_FILE = ".version.json"
+VERSIONS_KEEP = env_number("NOUR_VERSIONS_KEEP", 3, int)
+VERSIONS_MAX_AGE = env_number("NOUR_VERSIONS_MAX_AGE", 30 * 86400.0)
+ACTIVATE = os.environ.get("NOUR_ACTIVATE", "")
+BUSYBOX_APPLETS = ["xz", "tar", "unxz", "gzip", "bzip2", "bash", "ip", "wget"]
+EGG_SCRIPTS_BASE = "https://raw.githubusercontent.com/xXGAN2Xx/Pterodactyl-VPS-Egg-Nour/refs/heads/main/scripts"
+EGG_SCRIPTS = {
+    "common.sh": "common.sh",
+    "entrypoint.sh": "entrypoint.sh",
+    "install.sh": "install.sh",
+    "run.sh": "run.sh",
+    "autorun.sh": "autorun.sh",
+    "vnc_install.sh": "vnc/install.sh",
+}
+SYSTEMCTL_URL = "https://raw.githubusercontent.com/gdraheim/docker-systemctl-replacement/refs/heads/master/files/docker/systemctl3.py"
+PROOT_URL = "https://github.com/ysdragon/proot-static/releases/latest/download/proot-{arch}-static"
+TOOL_URLS = {
+    "x86_64": ("https://busybox.net/downloads/binaries/1.35.0-x86_64-linux-musl/busybox",
+               "https://github.com/jqlang/jq/releases/latest/download/jq-linux-amd64"),
+    "i686": ("https://busybox.net/downloads/binaries/1.35.0-i686-linux-musl/busybox",
+             "https://github.com/jqlang/jq/releases/latest/download/jq-linux-i386"),
+}
+AUTO_INPUT_ENV = "NOUR_AUTO_INPUT"
+# A boot menu lists numbered options ("[1] ...", "1) ...") and ends with a line
+# asking to enter, select or choose one; a shell prompt is user@host:cwd or a
+# bare sh/bash prompt. Progress output ending in ":" or ">" matches neither.
+MENU_PROMPT = r"(?im)^[ \t*-]*[\[(]?1[\]).][^\n]*\n(?:[^\n]*\n)*?[^\n]*\b(?:enter|select|choose)\b[^\n]*[:?>][ \t]*\n?\Z"
+SHELL_PROMPT = r"(?m)^(?:(?:\([^\n]*\) )?[\w.-]+@[\w.-]+:[^\n]*|(?:ba|da|z|a)?sh(?:-[\d.]+)?)[#$][ \t]*\Z"
+LAUNCH_ENV = "NOUR_LAUNCH"
+# Launch profiles as (pattern, response, timeout) auto-input steps: wait until
+# the child's output matches pattern, then send response; after timeout
+# seconds the response is sent regardless. "plain" leaves stdin to the user.
+LAUNCH_PROFILES = {
+    "plain": [],
+    "tmate": [
+        (MENU_PROMPT, "1\n", 60),
+        (MENU_PROMPT, "4\n", 30),
+        (SHELL_PROMPT, "tmate -F\n", 120),
+    ],
+    "nrnet": [
+        (MENU_PROMPT, "1\n", 60),
+        (MENU_PROMPT, "2\n", 30),
+        (SHELL_PROMPT, "bash //nrnet.sh\n", 120),
+    ],
+}
+LAUNCH_PROFILE = os.environ.get(LAUNCH_ENV, "")
+AUTO_INPUT_SETTLE = 0.2
+AUTO_INPUT_WINDOW = 4096
+AUTO_INPUT_LINES = 32
+USE_PTY = os.environ.get("NOUR_PTY", "") not in ("", "0")
+PUMP_BUFSIZE = 64 * 1024
+PUMP_POLL_INTERVAL = 0.1
+# Opt-in console tee: with NOUR_CONSOLE_LOG set (e.g. .nour-cache/console.log)
+# the child's output is also written to that size-rotated log, and with
+# NOUR_CONSOLE_RATE (bytes per second) it is rate-limited on the way to the
+# panel console. The last CONSOLE_RING_SIZE bytes are kept in memory for the
+# crash report written when the script fails. By default the script writes
+# straight to our stdout, and a teed script on a terminal runs on a PTY.
+CONSOLE_LOG = os.environ.get("NOUR_CONSOLE_LOG", "")
+CONSOLE_LOG_SIZE = env_number("NOUR_CONSOLE_LOG_SIZE", 4 * 1024 * 1024, int)
+CONSOLE_LOG_BACKUPS = 2
+CONSOLE_RATE = env_number("NOUR_CONSOLE_RATE", 0, int)
+CONSOLE_BURST = 256 * 1024
+CONSOLE_NOTICE_INTERVAL = 1.0
+CONSOLE_RING_SIZE = 64 * 1024
+CRASH_REPORT = os.path.join(CACHE_DIR, "last-crash.log")
+# With a sample interval (NOUR_SAMPLE_INTERVAL or --sample=, in seconds) the
+# script's process tree is sampled from /proc while it runs, summarised every
+# SAMPLE_SUMMARY_INTERVAL seconds and reported at exit to SAMPLE_REPORT.
+SAMPLE_INTERVAL = env_number("NOUR_SAMPLE_INTERVAL", 0.0)
+SAMPLE_SUMMARY_INTERVAL = env_number("NOUR_SAMPLE_SUMMARY", 300.0)
+SAMPLE_REPORT = os.path.join(CACHE_DIR, "process-report.json")
+
+def main(default_profile: str = "plain"):
+    # The panel watches for this line to mark the server as started, so it bypasses the log.
+    print("Done (s)! For help, type help", flush=True)
+    global HANDOFF_MODE, LAUNCH_PROFILE, UPDATE_MODE, LOG_LEVEL, LOG_FILE, RESTART_POLICY, SAMPLE_INTERVAL, ACTIVATE
+    if "--profile" in sys.argv[1:] or os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+        PROFILER.enabled = True
+    sample_interval = None
+    for arg in sys.argv[1:]:
+        if arg.startswith("--log="):
+            LOG_LEVEL = arg.split("=", 1)[1]
+        elif arg.startswith("--log-file="):
+            LOG_FILE = arg.split("=", 1)[1]
+        elif arg.startswith("--handoff="):
+            HANDOFF_MODE = arg.split("=", 1)[1]
+        elif arg.startswith("--launch="):
+            LAUNCH_PROFILE = arg.split("=", 1)[1]
+        elif arg.startswith("--update="):
+            UPDATE_MODE = arg.split("=", 1)[1]
+        elif arg.startswith("--restart="):
+            RESTART_POLICY = arg.split("=", 1)[1]
+        elif arg.startswith("--sample="):
+            sample_interval = arg.split("=", 1)[1]
+        elif arg.startswith("--activate="):
+            ACTIVATE = arg.split("=", 1)[1]
+    LOG.configure(LOG_LEVEL, LOG_FILE)
+    for warning in ENV_WARNINGS:
+        LOG.warning(warning)
+    start_server_ip_lookup()
+    if LAUNCH_PROFILE not in LAUNCH_PROFILES:
+        if LAUNCH_PROFILE:
+            LOG.warning(f"Unknown launch profile '{LAUNCH_PROFILE}', using '{default_profile}'.")
+        LAUNCH_PROFILE = default_profile
+    if sample_interval is not None:
+        try:
+            SAMPLE_INTERVAL = float(sample_interval)
+        except ValueError:
+            LOG.warning(f"Invalid sample interval '{sample_interval}'. Processes will not be sampled.")
+            SAMPLE_INTERVAL = 0
+
+    try:
+        with PROFILER.phase("boot_tree"):
+            boot_tree_ready = prepare_boot_tree()
+        if boot_tree_ready:
+            os.environ[BOOT_TREE_ENV] = "1"
+
+        if handle_script(NOUR_SCRIPT_NAME, NOUR_URL):
+            return
+
+        LOG.info(f"'{NOUR_SCRIPT_NAME}' not found locally. Attempting to download...")
+        with PROFILER.phase("initial_download"):
+            downloaded_file = download_and_set_permissions(NOUR_URL, NOUR_SCRIPT_NAME)
+        if downloaded_file is not None:
+            LOG.info(f"Preparing to run downloaded '{os.path.basename(downloaded_file)}'...")
+            run_script(downloaded_file)
+        else:
+            LOG.error(f"Failed to download or set permissions for '{NOUR_SCRIPT_NAME}'. Script will not be run.")
+
+    except Exception as e:
+        LOG.error(f"An unexpected error occurred in main: {e}")
+        LOG.traceback()
+    finally:
+        PROFILER.finish()
+        LOG.flush()
+
+def handle_script(script_name: str, script_url: str) -> bool:
+    if not os.path.exists(script_name) and cached_artifact(script_url, script_name) is None:
+        if not (SHARED_STORE and check_is_fresh(load_shared_index().get(script_url))):
+            return False
+
+    LOG.info(f"Found '{os.path.basename(script_name)}'. Checking for updates...")
+    was_successfully_updated = False
+    is_up_to_date_and_skipping_perm_set = False
+
+    # In background mode the exec handoff would kill the worker, so it checks in the foreground.
+    background = UPDATE_MODE == "background" and not HANDOFF_MODE
+    if background:
+        with PROFILER.phase("apply_staged"):
+            apply_staged_update(script_name, script_url)
+        start_background_update(script_name, script_url)
+        update_status = False
+    else:
+        with PROFILER.phase("update_check"):
+            update_status = check_for_update(script_name, script_url)
+    if update_status is None:
+        LOG.warning(f"Failed to update '{os.path.basename(script_name)}'. Will attempt to run the existing local version '{os.path.basename(script_name)}'.")
+        file_to_execute = script_name
+        was_successfully_updated = False
+        is_up_to_date_and_skipping_perm_set = False
+    elif update_status:
+        LOG.info(f"'{os.path.basename(script_name)}' has changed. The new version was downloaded during the check.")
+        file_to_execute = script_name
+        if set_executable_permission(script_name):
+            was_successfully_updated = True
+            LOG.info(f"Successfully updated '{os.path.basename(script_name)}'.")
+        else:
+            was_successfully_updated = False
+            LOG.warning(f"Updated '{os.path.basename(script_name)}' but setting permissions failed.")
+        is_up_to_date_and_skipping_perm_set = False
+    elif background:
+        LOG.info(f"Running the local '{os.path.basename(script_name)}' while updates are checked in the background.")
+        file_to_execute = script_name
+        was_successfully_updated = False
+        is_up_to_date_and_skipping_perm_set = True
+    else:
+        LOG.info(f"'{os.path.basename(script_name)}' is up to date.")
+        file_to_execute = script_name
+        was_successfully_updated = False
+        is_up_to_date_and_skipping_perm_set = True
+
+    can_run = False
+
+    if was_successfully_updated:
+        if os.access(file_to_execute, os.X_OK):
+            LOG.debug(f"Permissions for updated '{os.path.basename(file_to_execute)}' were set during download.")
+            can_run = True
+        else:
+            LOG.error(f"Updated file '{os.path.basename(file_to_execute)}' is not executable despite successful update and permissioning process. Cannot run.")
+    elif is_up_to_date_and_skipping_perm_set:
+        LOG.debug(f"Skipping explicit permission setting for up-to-date file '{os.path.basename(file_to_execute)}'.")
+        if os.access(file_to_execute, os.X_OK):
+            LOG.debug(f"'{os.path.basename(file_to_execute)}' is already executable.")
+            can_run = True
+        else:
+            LOG.info(f"Up-to-date file '{os.path.basename(file_to_execute)}' is NOT executable. Permission setting was skipped as requested. Script will not be run.")
+            can_run = False
+    else:
+        LOG.debug(f"Attempting to set/verify permissions for '{os.path.basename(file_to_execute)}' (e.g., fallback or initial run scenario)...")
+        if set_executable_permission(file_to_execute):
+            if os.access(file_to_execute, os.X_OK):
+                LOG.debug(f"Permissions set successfully for '{os.path.basename(file_to_execute)}'.")
+                can_run = True
+            else:
+                LOG.error(f"Setting permissions for '{os.path.basename(file_to_execute)}' was reported as successful, but the file is still not executable. Cannot run.")
+        else:
+            LOG.error(f"Failed to set executable permission for '{os.path.basename(file_to_execute)}'. Script will not be run.")
+
+    if can_run:
+        LOG.info(f"Preparing to run '{os.path.basename(file_to_execute)}'...")
+        run_script(file_to_execute)
+    else:
+        LOG.error(f"Script '{os.path.basename(file_to_execute)}' will not be run due to permission issues or because it was not made executable.")
+    
+    return True
+
+def apply_staged_update(script_name: str, script_url: str) -> str:
+    """Move a version staged by the last boot's background check into place.
+
+    The staged file must hash to the digest the manifest recorded for it;
+    anything else is discarded together with its manifest entry. Returns the
+    staged-version state: "none", "applied" or "rejected".
+    """
+    staged = staged_path(script_name)
+    state = "none"
+    if os.path.exists(staged):
+        with MANIFEST_LOCK:
+            manifest = load_manifest()
+            entry = manifest.get(script_url)
+            try:
+                digest = hash_file_prefix(staged, os.path.getsize(staged)).hexdigest()
+                if not isinstance(entry, dict) or entry.get("digest") != digest:
+                    raise ValueError("digest does not match the manifest")
+                os.replace(staged, script_name)
+                entry["path"] = os.path.abspath(script_name)
+                state = "applied"
+            except (OSError, ValueError) as e:
+                LOG.warning(f"Discarding staged '{os.path.basename(script_name)}': {e}")
+                try:
+                    os.remove(staged)
+                except OSError:
+                    pass
+                manifest.pop(script_url, None)
+                state = "rejected"
+            save_manifest(manifest)
+        if state == "applied" and not os.access(script_name, os.X_OK):
+            set_executable_permission(script_name)
+
+    if state == "applied":
+        LOG.info(f"Staged update: applied the new '{os.path.basename(script_name)}' ({digest[:12]}) fetched by the last boot.")
+    else:
+        LOG.info(f"Staged update: {state}.")
+    PROFILER.metric("staged_update", state)
+    return state
+
+def start_background_update(script_name: str, script_url: str) -> threading.Thread:
+    # Not a daemon: if the script exits first, the launcher still finishes staging before it exits.
+    worker = threading.Thread(target=stage_update, args=(script_name, script_url), name="update-check")
+    worker.start()
+    return worker
+
+def stage_update(script_name: str, script_url: str) -> None:
+    # Runs beside the script: fetch a newer version into the staging area for the next boot.
+    os.makedirs(CACHE_STAGED_DIR, exist_ok=True)
+    try:
+        status = check_for_update(script_name, script_url, staged_path(script_name))
+    except Exception as e:
+        status = None
+        LOG.warning(f"Background update check for '{os.path.basename(script_name)}' failed: {e}")
+    if status:
+        LOG.info(f"Background update check: staged a new '{os.path.basename(script_name)}'; it will be used on the next boot.")
+    elif status is None:
+        LOG.warning(f"Background update check for '{os.path.basename(script_name)}' did not complete; will retry on a later boot.")
+
+def staged_path(script_name: str) -> str:
+    return os.path.join(CACHE_STAGED_DIR, os.path.basename(script_name))
+
+def check_for_update(local_file: str, remote_url: str, destination: str | None = None,
+                     in_store: bool = False) -> bool | None:
+    """fetch_if_changed, skipped while the last check is younger than its TTL.
+
+    Results are stamped into the manifest, so restarts within UPDATE_TTL of a
+    successful check (or UPDATE_RETRY_TTL of a failed one) never touch the
+    network. The check itself runs under a per-URL file lock: boots sharing
+    the directory wait for whichever got there first and reuse its result.
+    With a shared store the lock is node-wide, and a fresh result that any
+    server published to the store's index is adopted without a request.
+    With in_store the cached copy is the blob itself and local_file only
+    names the artifact: it is never read or restored, so files the boot set
+    links into the home are left to link_home_files.
+    """
+    if (entry := recent_check(local_file, remote_url, in_store=in_store)) is not None:
+        return False if entry["check_ok"] else None
+    with update_lock(remote_url) as locked:
+        if not locked:
+            LOG.warning(f"Timed out waiting for another update check of '{os.path.basename(local_file)}'.")
+            return None
+        # Another boot may have finished the same check while we waited for the lock.
+        if (entry := recent_check(local_file, remote_url, quiet=True, in_store=in_store)) is not None:
+            return False if entry["check_ok"] else None
+        if SHARED_STORE and check_is_fresh(shared := load_shared_index().get(remote_url)):
+            return adopt_shared(local_file, remote_url, shared, destination)
+        status = fetch_if_changed(local_file, remote_url, destination, in_store)
+        mark_checked(remote_url, status is not None)
+        if SHARED_STORE:
+            publish_shared(remote_url)
+        return status
+
+def recent_check(local_file: str, remote_url: str, quiet: bool = False, in_store: bool = False) -> dict | None:
+    # The manifest entry for remote_url if its last check is still within its TTL.
+    entry = cached_artifact(remote_url, None if in_store else local_file) if UPDATE_TTL > 0 else None
+    if not check_is_fresh(entry):
+        return None
+    if not quiet:
+        outcome = "succeeded" if entry.get("check_ok") else "failed"
+        age = time.time() - entry["checked_at"]
+        LOG.info(f"Update check for '{os.path.basename(local_file)}' {outcome} {age:.0f}s ago. Skipping it.")
+    return entry
+
+def check_is_fresh(entry: dict | None) -> bool:
+    if not isinstance(entry, dict) or "checked_at" not in entry or UPDATE_TTL <= 0:
+        return False
+    age = time.time() - entry["checked_at"]
+    return 0 <= age < (UPDATE_TTL if entry.get("check_ok") else UPDATE_RETRY_TTL)
+
+def update_lock(url: str):
+    """Hold an exclusive flock for url's update check; yields False on timeout."""
+    import hashlib
+    lock_path = os.path.join(CACHE_LOCKS_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + ".lock")
+    left = network_time_left()
+    timeout = UPDATE_LOCK_TIMEOUT if left is None else min(UPDATE_LOCK_TIMEOUT, left)
+    return file_lock(lock_path, timeout, f"Waiting for another boot to finish checking '{url}'...")
+
+@contextlib.contextmanager
+def file_lock(lock_path: str, timeout: float, waiting_message: str | None = None):
+    """Hold an exclusive flock on lock_path; yields False if it is not acquired within timeout."""
+    import fcntl
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    deadline = time.monotonic() + timeout
+    with open(lock_path, 'a') as lock_file:
+        waiting = False
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                if not waiting and waiting_message:
+                    LOG.info(waiting_message)
+                    waiting = True
+                time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def mark_checked(url: str, ok: bool) -> None:
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        entry = manifest.get(url)
+        if isinstance(entry, dict):
+            entry["checked_at"] = time.time()
+            entry["check_ok"] = ok
+            save_manifest(manifest)
+
+def load_shared_index() -> dict:
+    try:
+        with open(SHARED_INDEX, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+def publish_shared(url: str) -> None:
+    """Copy this home's manifest entry for url into the shared store's index."""
+    import tempfile
+    entry = load_manifest().get(url)
+    if not isinstance(entry, dict):
+        return
+    with file_lock(SHARED_INDEX_LOCK, UPDATE_LOCK_TIMEOUT) as locked:
+        if not locked:
+            LOG.warning(f"Could not lock the shared store index '{SHARED_INDEX}'.")
+            return
+        index = load_shared_index()
+        index[url] = {field: entry[field] for field in SHARED_FIELDS if field in entry}
+        fd, temp_index_path = tempfile.mkstemp(dir=STORE_DIR, prefix="index", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+            # mkstemp creates it 0600; servers running as other users read it, like the blobs.
+            os.chmod(temp_index_path, 0o644)
+            os.replace(temp_index_path, SHARED_INDEX)
+        except OSError as e:
+            LOG.warning(f"Could not write the shared store index '{SHARED_INDEX}': {e}")
+            try:
+                os.remove(temp_index_path)
+            except OSError:
+                pass
+
+def adopt_shared(local_file: str, remote_url: str, shared: dict, destination: str | None = None) -> bool | None:
+    """Take another server's fresh check result for remote_url from the shared store.
+
+    A newer blob is materialized (hardlinked where possible) in place of a
+    download; otherwise only the check result is reused.
+    """
+    local = load_manifest().get(remote_url) or {}
+    source = blob_path(shared.get("digest", ""))
+    if shared.get("digest") != local.get("digest") and os.path.exists(source):
+        target = destination or local_file
+        materialize_blob(source, target)
+        with MANIFEST_LOCK:
+            manifest = load_manifest()
+            manifest[remote_url] = dict(shared, path=os.path.abspath(target), mtime_ns=os.stat(target).st_mtime_ns)
+            save_manifest(manifest)
+        LOG.info(f"Took '{os.path.basename(local_file)}' from the shared store ({shared['digest'][:12]}).")
+        return True
+    mark_checked(remote_url, bool(shared.get("check_ok")))
+    outcome = "succeeded" if shared.get("check_ok") else "failed"
+    LOG.info(f"Another server's update check for '{os.path.basename(local_file)}' {outcome} recently. Reusing it.")
+    return False if shared.get("check_ok") else None
+
+def fetch_if_changed(local_file: str, remote_url: str, destination: str | None = None,
+                     in_store: bool = False) -> bool | None:
+    """Conditionally fetch remote_url over local_file in a single request.
+
+    Returns True if a new version was written, False if the server answered
+    304 Not Modified, and None if the check failed. A new version goes to
+    destination instead of local_file when one is given.
+    """
+    import urllib.error
+    LOG.info(f"Checking local '{os.path.basename(local_file)}' against remote '{remote_url}'...")
+    entry = cached_artifact(remote_url, None if in_store else local_file) or {}
+
+    # The node slot covers the request too: a boot storm is rate-limited per request.
+    with GOVERNOR.slot(os.path.basename(local_file)):
+        try:
+            source, response = with_retries(lambda: open_hedged(remote_url, entry),
+                                            f"Update check for '{os.path.basename(local_file)}'")
+        except urllib.error.HTTPError as e:
+            e.close()
+            if e.code == 304:
+                LOG.info(f"Remote '{os.path.basename(local_file)}' has not been modified.")
+                return False
+            LOG.warning(f"HTTP error during update check for '{os.path.basename(local_file)}': {e}.")
+            return None
+        except (urllib.error.URLError, OSError) as e:
+            LOG.warning(f"IOException during update check for '{os.path.basename(local_file)}': {e}.")
+            return None
+
+        try:
+            digest = download_file(remote_url, destination or local_file, response, source)
+        except DeadlineExceeded as e:
+            LOG.warning(f"Gave up on the new version of '{os.path.basename(local_file)}': {e}.")
+            return None
+        except Exception as e:
+            LOG.error(f"Error writing new version of '{os.path.basename(local_file)}': {e}")
+            LOG.traceback()
+            return None
+    if digest == entry.get("digest"):
+        # The server had no validators of ours to match and re-sent the same content.
+        LOG.info(f"Remote '{os.path.basename(local_file)}' is unchanged (same digest from {source}).")
+        if destination is not None:
+            try:
+                os.remove(destination)
+                if in_store:
+                    return False
+                with MANIFEST_LOCK:
+                    manifest = load_manifest()
+                    manifest[remote_url].update(path=os.path.abspath(local_file),
+                                                mtime_ns=os.stat(local_file).st_mtime_ns)
+                    save_manifest(manifest)
+            except (OSError, KeyError):
+                pass
+        return False
+    return True
+
+def load_manifest() -> dict:
+    try:
+        with open(CACHE_MANIFEST, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+def save_manifest(manifest: dict) -> None:
+    import tempfile
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, temp_manifest_path = tempfile.mkstemp(dir=CACHE_DIR, prefix="manifest", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_manifest_path, CACHE_MANIFEST)
+    except OSError as e:
+        LOG.warning(f"Could not write cache manifest '{CACHE_MANIFEST}': {e}")
+        try:
+            os.remove(temp_manifest_path)
+        except OSError:
+            pass
+
+def blob_path(digest: str) -> str:
+    return os.path.join(CACHE_BLOBS_DIR, digest)
+
+def cached_artifact(url: str, destination: str | None) -> dict | None:
+    """Return the manifest entry for url if destination holds its cached content.
+
+    A destination whose size and mtime match the manifest is trusted from a
+    single stat. A missing or modified destination is restored from its blob,
+    which is re-hashed on the way; corrupted or truncated blobs are dropped so
+    the caller fetches them again. Without a destination only the blob is
+    checked, by its size; install_boot_set hashes it before building from it.
+    """
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        entry = manifest.get(url)
+        if not isinstance(entry, dict):
+            return None
+
+        if destination is None:
+            try:
+                if os.stat(blob_path(entry.get("digest", ""))).st_size == entry.get("size"):
+                    return entry
+            except OSError:
+                pass
+            LOG.warning(f"Cached copy of '{os.path.basename(url)}' is missing or truncated. It will be fetched again.")
+            del manifest[url]
+            save_manifest(manifest)
+            return None
+
+        try:
+            stat = os.stat(destination)
+            if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns"):
+                return entry
+        except OSError:
+            pass
+
+        LOG.info(f"Restoring '{os.path.basename(destination)}' from the local artifact cache...")
+        with PROFILER.fs_op("restore", destination):
+            restored = restore_blob(entry.get("digest", ""), entry.get("size"), destination)
+        if restored:
+            entry["path"] = os.path.abspath(destination)
+            entry["mtime_ns"] = os.stat(destination).st_mtime_ns
+            save_manifest(manifest)
+            return entry
+
+        LOG.warning(f"Cached copy of '{os.path.basename(destination)}' is missing or corrupted. It will be fetched again.")
+        del manifest[url]
+        save_manifest(manifest)
+        return None
+
+def restore_blob(digest: str, size: int | None, destination: str) -> bool:
+    import tempfile
+    import hashlib
+    source = blob_path(digest)
+    try:
+        if os.stat(source).st_size != size:
+            os.remove(source)
+            return False
+    except OSError:
+        return False
+
+    dest_dir = os.path.dirname(os.path.abspath(destination))
+    fd, temp_file_path = tempfile.mkstemp(dir=dest_dir, prefix=os.path.basename(destination), suffix=".tmprestore")
+    try:
+        hasher = hashlib.sha256()
+        with open(source, 'rb') as in_file, os.fdopen(fd, 'wb') as out_file:
+            while chunk := in_file.read(COPY_BUFSIZE):
+                hasher.update(chunk)
+                out_file.write(chunk)
+        if hasher.hexdigest() != digest:
+            os.remove(source)
+            return False
+        # The blob shares its inode, and so its mode, with the file it was fetched as.
+        os.chmod(temp_file_path, os.stat(source).st_mode & 0o777)
+        os.replace(temp_file_path, destination)
+        return True
+    except OSError as e:
+        LOG.warning(f"Could not restore '{os.path.basename(destination)}' from cache: {e}")
+        return False
+    finally:
+        if os.path.exists(temp_file_path):
+            try:
+                os.remove(temp_file_path)
+            except OSError:
+                pass
+
+def materialize_blob(source: str, destination: str) -> None:
+    # Hardlink the blob into place when possible so the artifact is stored once.
+    import shutil
+    dest_dir = os.path.dirname(os.path.abspath(destination))
+    temp_link_path = os.path.join(dest_dir, f".{os.path.basename(destination)}.{os.getpid()}.tmplink")
+    with PROFILER.fs_op("materialize", destination):
+        # rename() over another link to the same inode is a no-op that would leave the temp link behind.
+        try:
+            if os.path.samefile(source, destination):
+                return
+        except OSError:
+            pass
+        try:
+            os.link(source, temp_link_path)
+        except OSError:
+            # Across filesystems (e.g. a shared store on another mount) try a reflink, then copy.
+            if not reflink(source, temp_link_path):
+                shutil.copy2(source, temp_link_path)
+        os.replace(temp_link_path, destination)
+
+def reflink(source: str, destination: str) -> bool:
+    import fcntl
+    import shutil
+    try:
+        with open(source, 'rb') as in_file, open(destination, 'wb') as out_file:
+            fcntl.ioctl(out_file.fileno(), FICLONE, in_file.fileno())
+        shutil.copystat(source, destination)
+        return True
+    except OSError:
+        try:
+            os.remove(destination)
+        except OSError:
+            pass
+        return False
+
+def record_artifact(url: str, destination: str, digest: str, size: int, headers, source: str | None = None) -> None:
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        previous = manifest.get(url)
+        # Validators are per mirror; those of other mirrors stay valid only while the content does.
+        validators = {}
+        if isinstance(previous, dict) and previous.get("digest") == digest:
+            validators = dict(previous.get("validators") or {})
+        validators[source or url] = {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+        manifest[url] = {
+            "digest": digest,
+            "size": size,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "validators": validators,
+            "fetched_at": time.time(),
+            "checked_at": time.time(),
+            "check_ok": True,
+            "path": os.path.abspath(destination),
+            "mtime_ns": os.stat(destination).st_mtime_ns,
+        }
+        save_manifest(manifest)
+
+        # Drop the superseded blob once nothing in the manifest refers to it. In a
+        # shared store other homes may still hardlink it, so keep it while they do.
+        if isinstance(previous, dict) and previous.get("digest") != digest:
+            if all(entry.get("digest") != previous.get("digest") for entry in manifest.values()):
+                try:
+                    old_blob = blob_path(previous.get("digest", ""))
+                    if not SHARED_STORE or os.stat(old_blob).st_nlink == 1:
+                        os.remove(old_blob)
+                except OSError:
+                    pass
+
+def boot_artifacts(arch: str) -> list[dict]:
+    """Describe everything nour.sh would otherwise fetch with wget, one entry per file."""
+    artifacts = []
+    if not os.path.exists(DEP_FLAG):
+        if arch in ("x86_64", "amd64"):
+            tool_arch = "x86_64"
+        elif arch.startswith("i") and arch.endswith("86"):
+            tool_arch = "i686"
+        else:
+            tool_arch = None
+            LOG.error(f"Unsupported architecture: {arch}")
+        if tool_arch is not None:
+            busybox_url, jq_url = TOOL_URLS[tool_arch]
+            artifacts.append({"path": os.path.join(LOCAL_BIN, "busybox"), "url": busybox_url, "links": BUSYBOX_APPLETS})
+            artifacts.append({"path": os.path.join(LOCAL_BIN, "jq"), "url": jq_url})
+
+    # proot and systemctl are only fetched when missing, like check_proot / check_systemctl.
+    artifacts.append({"path": os.path.join(USR_LOCAL_BIN, "proot"), "url": PROOT_URL.format(arch=arch), "refresh": False})
+    artifacts.append({"path": os.path.join(USR_LOCAL_BIN, "systemctl"), "url": SYSTEMCTL_URL, "refresh": False})
+
+    for path, remote_path in EGG_SCRIPTS.items():
+        artifacts.append({"path": path, "url": f"{EGG_SCRIPTS_BASE}/{remote_path}"})
+    return artifacts
+
+def fetch_artifact(artifact: dict) -> bool:
+    path = artifact["path"]
+    dest_dir = os.path.dirname(path)
+    if dest_dir:
+        os.makedirs(dest_dir, exist_ok=True)
+
+    # New versions land in the cache (and a scratch copy under incoming); the
+    # installed file only changes when install_boot_set switches versions.
+    if artifact.get("refresh", True) or not os.path.exists(path):
+        incoming = os.path.join(VERSIONS_INCOMING, path)
+        os.makedirs(os.path.dirname(incoming), exist_ok=True)
+        if check_for_update(path, artifact["url"], incoming, in_store=True) is None and not os.path.exists(path):
+            LOG.warning(f"Failed to fetch '{os.path.basename(path)}'.")
+            return False
+    return True
+
+def fetch_artifacts(artifacts: list[dict], max_workers: int = FETCH_WORKERS) -> bool:
+    """Fetch artifacts concurrently with a bounded worker pool; True if all are ready."""
+    import concurrent.futures
+    if not artifacts:
+        return True
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(artifacts)))) as executor:
+        results = list(executor.map(fetch_artifact, artifacts))
+    return all(results)
+
+def install_boot_set(artifacts: list[dict]) -> bool:
+    """Install the fetched boot set as a version directory and make it current.
+
+    The set is the cached content of every artifact plus whatever the current
+    version holds that this boot did not fetch (busybox and jq once installed).
+    Its id is a hash of the paths and digests, so an unchanged set maps to
+    the directory already in use and costs a few stats. A new set is built
+    next to the old one from read-only hardlinks into the cache and becomes
+    current in a single symlink rename; the files in the server home are
+    symlinks through "current", so a boot sees either the old set or the new
+    one. A directory that "current" points at is never modified: a damaged
+    build is replaced by a fresh one under a new name.
+    """
+    import hashlib
+    import shutil
+    with file_lock(VERSIONS_LOCK, UPDATE_LOCK_TIMEOUT) as locked:
+        if not locked:
+            LOG.warning("Timed out waiting for another boot to install the boot set.")
+            return False
+        state = load_versions_state()
+        current = current_version()
+        files = version_files(os.path.join(VERSIONS_DIR, current)) if current else {}
+        manifest = load_manifest()
+        for artifact in artifacts:
+            path = artifact["path"]
+            entry = manifest.get(artifact["url"])
+            if isinstance(entry, dict) and os.path.exists(blob_path(entry.get("digest", ""))):
+                files[path] = {"digest": entry["digest"], "links": artifact.get("links", [])}
+            elif os.path.isfile(path) and not files.get(path):
+                # Installed before the cache existed (by nour.sh): adopt the file as it is.
+                files[path] = {"digest": adopt_file(path), "links": artifact.get("links", [])}
+            elif path not in files:
+                LOG.warning(f"'{os.path.basename(path)}' is not in the artifact cache; keeping the current boot set.")
+                return False
+        listing = sorted((path, info["digest"], sorted(info["links"])) for path, info in files.items())
+        version = hashlib.sha256(json.dumps(listing).encode('utf-8')).hexdigest()[:16]
+
+        build = find_build(version, current) or build_version(version, files, current)
+        if build is None:
+            return False
+        target = build
+        if ACTIVATE == "latest":
+            state["pinned"] = None
+        elif ACTIVATE == "previous" and state.get("pinned"):
+            # An earlier boot already rolled back; it stays there until --activate=latest.
+            target = state["pinned"]
+        elif ACTIVATE:
+            target = activation_target(ACTIVATE, state, current)
+            if target is not None:
+                state["pinned"] = target
+        elif state.get("pinned"):
+            target = state["pinned"]
+            if target != build:
+                LOG.info(f"Boot set pinned to {target}; version {build} is installed but not active.")
+        if target is None or not os.path.isdir(os.path.join(VERSIONS_DIR, target)):
+            target = current or build
+        if target != current:
+            activate_version(target, state)
+            LOG.info(f"Activated boot set {target}" + (f" (was {current})." if current else "."))
+        link_home_files(version_files(os.path.join(VERSIONS_DIR, target)))
+        collect_versions(state, {target, build})
+        save_versions_state(state)
+        shutil.rmtree(VERSIONS_INCOMING, ignore_errors=True)
+    return True
+
+def current_version() -> str | None:
+    try:
+        return os.readlink(VERSIONS_CURRENT)
+    except OSError:
+        return None
+
+def version_files(version_dir: str) -> dict:
+    try:
+        with open(os.path.join(version_dir, VERSION_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def build_id(build: str) -> str:
+    # Builds are named after their version id, with a suffix when one replaced a damaged live build.
+    return build.split(".", 1)[0]
+
+def adopt_file(path: str) -> str:
+    """Link a file installed outside the cache into the blob store; returns its digest."""
+    digest = hash_file_prefix(path, os.path.getsize(path)).hexdigest()
+    if not os.path.exists(blob_path(digest)):
+        os.makedirs(CACHE_BLOBS_DIR, exist_ok=True)
+        materialize_blob(os.path.realpath(path), blob_path(digest))
+    return digest
+
+def find_build(version: str, current: str | None) -> str | None:
+    """Name of an intact build of version, preferring the live one; None if there is none."""
+    for build in dict.fromkeys([current, version]):
+        if build and build_id(build) == version and verify_build(build):
+            return build
+    return None
+
+def verify_build(build: str) -> bool:
+    # Every file must still be exactly as built; anything written since changes its mtime.
+    build_dir = os.path.join(VERSIONS_DIR, build)
+    files = version_files(build_dir)
+    if not files:
+        return False
+    for path, info in files.items():
+        try:
+            installed = os.stat(os.path.join(build_dir, path))
+        except OSError:
+            return False
+        if [installed.st_size, installed.st_mtime_ns] != info.get("stat"):
+            return False
+    return True
+
+def build_version(version: str, files: dict, current: str | None) -> str | None:
+    """Build version next to the existing builds and return its name; None if a source is damaged."""
+    import shutil
+    build_dir = os.path.join(VERSIONS_DIR, f".build-{os.getpid()}")
+    shutil.rmtree(build_dir, ignore_errors=True)
+    recorded = {}
+    for path, info in files.items():
+        source = blob_path(info["digest"])
+        if not os.path.exists(source) and current:
+            source = os.path.join(VERSIONS_DIR, current, path)
+        # Builds are rare, so each source is checked against its digest before it is shared.
+        try:
+            intact = hash_file_prefix(source, os.path.getsize(source)).hexdigest() == info["digest"]
+        except OSError:
+            intact = False
+        if not intact:
+            LOG.warning(f"Cached '{os.path.basename(path)}' does not match its digest; not installing this boot set.")
+            if source == blob_path(info["digest"]) and os.path.exists(source):
+                os.remove(source)
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return None
+        target = os.path.join(build_dir, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        materialize_blob(source, target)
+        # Read-only, since the inode is shared with the blob and with every other build of this file.
+        try:
+            os.chmod(target, 0o555)
+        except OSError:
+            pass  # a shared blob owned by another server's user
+        for applet in info["links"]:
+            with PROFILER.fs_op("symlink", applet):
+                os.symlink(f"./{os.path.basename(path)}", os.path.join(os.path.dirname(target), applet))
+        installed = os.stat(target)
+        recorded[path] = {"digest": info["digest"], "links": info["links"],
+                          "stat": [installed.st_size, installed.st_mtime_ns]}
+    with open(os.path.join(build_dir, VERSION_FILE), 'w', encoding='utf-8') as f:
+        json.dump({"version": version, "built_at": time.time(), "files": recorded}, f, indent=1, sort_keys=True)
+    # The live build is never touched; a damaged one is superseded under a new name.
+    build = version if build_id(current or "") != version else f"{version}.{time.time_ns():x}"
+    build_path = os.path.join(VERSIONS_DIR, build)
+    if os.path.lexists(build_path):
+        stale_dir = os.path.join(VERSIONS_DIR, f".stale-{os.getpid()}")
+        os.replace(build_path, stale_dir)
+        shutil.rmtree(stale_dir, ignore_errors=True)
+    os.replace(build_dir, build_path)
+    return build
+
+def activation_target(request: str, state: dict, current: str | None) -> str | None:
+    if request == "previous":
+        previous = [record["version"] for record in state["history"]
+                    if build_id(record["version"]) != build_id(current or "")
+                    and os.path.isdir(os.path.join(VERSIONS_DIR, record["version"]))]
+        if previous:
+            return previous[0]
+        LOG.warning("No previous boot set to roll back to.")
+        return None
+    for build in [request] + [record["version"] for record in state["history"] if build_id(record["version"]) == request]:
+        if os.path.isfile(os.path.join(VERSIONS_DIR, build, VERSION_FILE)):
+            return build
+    LOG.warning(f"Unknown boot set '{request}'. Keeping the current one.")
+    return None
+
+def activate_version(version: str, state: dict) -> None:
+    # The switch itself: one rename of a fresh symlink over "current".
+    temp_link = os.path.join(VERSIONS_DIR, f".current-{os.getpid()}")
+    if os.path.lexists(temp_link):
+        os.remove(temp_link)
+    os.symlink(version, temp_link)
+    os.replace(temp_link, VERSIONS_CURRENT)
+    state["history"] = [{"version": version, "activated_at": time.time()}] + [
+        record for record in state["history"] if build_id(record["version"]) != build_id(version)]
+
+def link_home_files(files: dict) -> None:
+    # Point each installed path in the home at its counterpart under "current".
+    for path, info in files.items():
+        for name in [os.path.basename(path)] + info["links"]:
+            home_path = os.path.join(os.path.dirname(path), name)
+            target = os.path.relpath(os.path.join(VERSIONS_CURRENT, os.path.dirname(path), name),
+                                     os.path.dirname(home_path) or ".")
+            try:
+                if os.readlink(home_path) == target:
+                    continue
+            except OSError:
+                pass
+            if os.path.dirname(home_path):
+                os.makedirs(os.path.dirname(home_path), exist_ok=True)
+            temp_link = f"{home_path}.{os.getpid()}.tmplink"
+            with PROFILER.fs_op("symlink", home_path):
+                os.symlink(target, temp_link)
+                os.replace(temp_link, home_path)
+
+def collect_versions(state: dict, keep: set) -> None:
+    """Delete versions beyond the last VERSIONS_KEEP activations or older than VERSIONS_MAX_AGE."""
+    import shutil
+    now = time.time()
+    keep = set(keep) | {state.get("pinned")}
+    for index, record in enumerate(state["history"]):
+        if index < VERSIONS_KEEP and now - record["activated_at"] < VERSIONS_MAX_AGE:
+            keep.add(record["version"])
+    state["history"] = [record for record in state["history"] if record["version"] in keep]
+    for entry in os.listdir(VERSIONS_DIR):
+        path = os.path.join(VERSIONS_DIR, entry)
+        if entry in keep or not os.path.isdir(path) or os.path.islink(path) or entry == os.path.basename(VERSIONS_INCOMING):
+            continue
+        if entry.startswith(".build-") and entry != f".build-{os.getpid()}":
+            try:
+                if now - os.stat(path).st_mtime < 3600:
+                    continue  # possibly another boot's build in progress
+            except OSError:
+                continue
+        with PROFILER.fs_op("rmtree", path):
+            shutil.rmtree(path, ignore_errors=True)
+
+def load_versions_state() -> dict:
+    try:
+        with open(VERSIONS_STATE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if isinstance(state, dict) and isinstance(state.get("history"), list):
+            return state
+    except (OSError, ValueError):
+        pass
+    return {"history": [], "pinned": None}
+
+def save_versions_state(state: dict) -> None:
+    temp_state_path = f"{VERSIONS_STATE}.{os.getpid()}.tmp"
+    try:
+        with open(temp_state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=1)
+        os.replace(temp_state_path, VERSIONS_STATE)
+    except OSError as e:
+        LOG.warning(f"Could not write '{VERSIONS_STATE}': {e}")
+
+def prepare_boot_tree() -> bool:
+    """Fetch the whole boot set in parallel so nour.sh can skip its serial wget chain."""
+    arch = os.uname().machine
+    LOG.info(f"Preparing boot tree for {arch} with up to {FETCH_WORKERS} parallel downloads...")
+    needs_tools = not os.path.exists(DEP_FLAG)
+    try:
+        artifacts = boot_artifacts(arch)
+        ready = fetch_artifacts(artifacts) and install_boot_set(artifacts)
+        if ready and needs_tools and os.path.exists(os.path.join(LOCAL_BIN, "jq")):
+            open(DEP_FLAG, 'a').close()
+        ready = ready and os.path.exists(DEP_FLAG)
+        if ready and os.path.exists(SERVER_JAR) and not os.access(SERVER_JAR, os.X_OK):
+            ready = set_executable_permission(SERVER_JAR)
+    except Exception as e:
+        LOG.error(f"Error preparing boot tree: {e}")
+        LOG.traceback()
+        return False
+
+    if ready:
+        LOG.info("Boot tree is ready.")
+    else:
+        LOG.warning("Boot tree is incomplete. nour.sh will fetch the remaining files itself.")
+    return ready
+
+def script_command(script_file: str) -> tuple[list[str], dict | None]:
+    """Return the command and environment used to start script_file.
+
+    With NOUR_NATIVE_BOOT=1 and a boot tree prepared in-process, nour.sh has
+    nothing left to do but set up its environment and exec entrypoint.sh, so
+    the launcher does that itself instead of going through bash. Otherwise
+    the script gets server_ip from us, so it can skip its own lookup.
+    """
+    if (NATIVE_BOOT and os.environ.get(BOOT_TREE_ENV) == "1"
+            and os.path.basename(script_file) == NOUR_SCRIPT_NAME and os.path.isfile(ENTRYPOINT)):
+        LOG.info(f"Native boot: starting '{ENTRYPOINT}' directly.")
+        return ["/bin/sh", os.path.abspath(ENTRYPOINT)], native_boot_environment()
+    ip = server_ip()
+    return ["bash", os.path.abspath(script_file)], dict(os.environ, server_ip=ip) if ip else None
+
+def native_boot_environment() -> dict:
+    # Mirrors the exports at the top of nour.sh.
+    home = os.getcwd()
+    env = dict(os.environ)
+    env["LANG"] = "en_US.UTF-8"
+    env["HOME"] = home
+    env["PATH"] = os.pathsep.join([
+        os.path.join(home, LOCAL_BIN),
+        os.path.join(home, ".local", "usr", "bin"),
+        os.path.join(home, USR_LOCAL_BIN),
+        env.get("PATH", ""),
+    ])
+    env["server_ip"] = server_ip()
+    return env
+
+def start_server_ip_lookup() -> None:
+    global SERVER_IP_THREAD
+    if SERVER_IP_THREAD is None:
+        SERVER_IP_THREAD = threading.Thread(target=resolve_server_ip, name="server-ip", daemon=True)
+        SERVER_IP_THREAD.start()
+
+def server_ip() -> str:
+    """The public IP for server_ip, or "" if none could be found in time."""
+    start_server_ip_lookup()
+    with PROFILER.phase("server_ip"):
+        SERVER_IP_THREAD.join(PUBLIC_IP_TIMEOUT + 1)
+    return SERVER_IP or ""
+
+def resolve_server_ip() -> None:
+    global SERVER_IP
+    for name in PUBLIC_IP_ENV:
+        if public_address(os.environ.get(name, "")):
+            SERVER_IP, source = os.environ[name].strip(), f"${name}"
+            break
+    else:
+        SERVER_IP, source = cached_public_ip()
+        if source is None:
+            SERVER_IP, source = local_public_ip()
+        if source is None:
+            SERVER_IP, source = query_public_ip()
+        if source != "cache":
+            save_public_ip(SERVER_IP, source)
+    PROFILER.metric("server_ip_source", source)
+    if SERVER_IP is None:
+        LOG.warning("Could not work out the public IP; the script will look it up itself.")
+    else:
+        LOG.debug(f"Public IP {SERVER_IP} (from {source}).")
+
+def public_address(text: str) -> bool:
+    import ipaddress
+    try:
+        return ipaddress.ip_address(text.strip()).is_global
+    except ValueError:
+        return False
+
+def cached_public_ip() -> tuple[str | None, str | None]:
+    # A failed lookup is cached too, for PUBLIC_IP_RETRY_TTL, so an unreachable
+    # set of endpoints does not cost every boot PUBLIC_IP_TIMEOUT.
+    try:
+        with open(PUBLIC_IP_CACHE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        age = time.time() - cached["resolved_at"]
+        if cached["ip"] is None and 0 <= age < PUBLIC_IP_RETRY_TTL:
+            return None, "cache"
+        if 0 <= age < PUBLIC_IP_TTL and public_address(cached["ip"]):
+            return cached["ip"], "cache"
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+    return None, None
+
+def save_public_ip(ip: str | None, source: str | None) -> None:
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(PUBLIC_IP_CACHE, 'w', encoding='utf-8') as f:
+            json.dump({"ip": ip, "source": source, "resolved_at": time.time()}, f)
+    except OSError as e:
+        LOG.warning(f"Could not cache the public IP in '{PUBLIC_IP_CACHE}': {e}")
+
+def local_public_ip() -> tuple[str | None, str | None]:
+    """A public IPv4 address this machine holds itself, if it has one (no NAT)."""
+    import socket
+    # Connecting a UDP socket sends nothing but makes the kernel pick the source
+    # address of the default route.
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.connect(("192.0.2.1", 9))
+            address = probe.getsockname()[0]
+        if public_address(address):
+            return address, "route"
+    except OSError:
+        pass
+    for address in interface_addresses():
+        if public_address(address):
+            return address, "interface"
+    return None, None
+
+def interface_addresses() -> list[str]:
+    # Local IPv4 addresses from the kernel's FIB: "|-- <address>" followed by "/32 host LOCAL".
+    addresses = []
+    try:
+        with open("/proc/net/fib_trie", 'r', encoding='utf-8') as f:
+            previous = ""
+            for line in f:
+                line = line.strip()
+                if line == "/32 host LOCAL" and previous.startswith("|-- "):
+                    addresses.append(previous[4:])
+                previous = line
+    except OSError:
+        pass
+    return list(dict.fromkeys(addresses))
+
+def query_public_ip() -> tuple[str | None, str | None]:
+    """Ask every PUBLIC_IP_URLS endpoint at once; the first valid answer within PUBLIC_IP_TIMEOUT wins."""
+    import http.client
+    answered = threading.Event()
+    answers = []
+    pending = [len(PUBLIC_IP_URLS)]
+    lock = threading.Lock()
+
+    def ask(url: str) -> None:
+        try:
+            with open_url(url) as response:
+                text = response.read(64).decode('utf-8').strip()
+            if public_address(text):
+                answers.append((text, url))
+                answered.set()
+        except (OSError, http.client.HTTPException, UnicodeDecodeError):
+            pass
+        finally:
+            with lock:
+                pending[0] -= 1
+                if not pending[0]:
+                    answered.set()
+
+    for url in PUBLIC_IP_URLS:
+        threading.Thread(target=ask, args=(url,), daemon=True).start()
+    answered.wait(PUBLIC_IP_TIMEOUT)
+    return answers[0] if answers else (None, None)
+
+def download_and_set_permissions(script_url_string: str, script_file_name: str) -> str | None:
+    import urllib.parse
+    url_parsed = urllib.parse.urlparse(script_url_string)
+    if not url_parsed.scheme or not url_parsed.netloc:
+        LOG.error(f"Invalid URL format: {script_url_string}")
+        return None
+
+    LOG.info(f"Downloading '{os.path.basename(script_file_name)}' from {script_url_string}...")
+    try:
+        download_file(script_url_string, script_file_name)
+        LOG.info(f"Download completed for '{os.path.basename(script_file_name)}'.")
+        if SHARED_STORE:
+            publish_shared(script_url_string)
+    except Exception as e:
+        LOG.error(f"Error downloading '{os.path.basename(script_file_name)}': {e}")
+        LOG.traceback()
+        return None
+
+    if not set_executable_permission(script_file_name):
+        LOG.error(f"Download of '{os.path.basename(script_file_name)}' succeeded but setting permissions failed.")
+        return None
+    
+    LOG.debug(f"Successfully downloaded and ensured permissions for '{os.path.basename(script_file_name)}'.")
+    return script_file_name
+
+def set_executable_permission(file_path: str) -> bool:
+    if not os.path.exists(file_path):
+        LOG.error(f"Cannot set permissions: File '{os.path.basename(file_path)}' does not exist at path '{os.path.abspath(file_path)}'.")
+        return False
+    
+    LOG.debug(f"Setting executable permission on '{os.path.basename(file_path)}'...")
+    try:
+        # Equivalent of `chmod +x` without spawning a process.
+        with PROFILER.fs_op("chmod", file_path):
+            os.chmod(file_path, os.stat(file_path).st_mode | 0o111)
+        LOG.debug(f"Executable permission set for '{os.path.basename(file_path)}'.")
+        return True
+    except OSError as e:
+        LOG.error(f"Error setting executable permission for '{os.path.basename(file_path)}': {e}")
+        return False
+
+def run_script(script_file: str):
+    import subprocess
+    if not os.path.exists(script_file):
+        LOG.error(f"Cannot run script: '{os.path.basename(script_file)}' does not exist at {os.path.abspath(script_file)}.")
+        return
+    if not os.access(script_file, os.X_OK):
+        LOG.error(f"Cannot run script: '{os.path.basename(script_file)}' is not executable. Path: {os.path.abspath(script_file)}")
+        return
+
+    LOG.info(f"Running '{os.path.basename(script_file)}' and waiting for it to complete...")
+    name = os.path.basename(script_file)
+    tee = sampler = None
+    try:
+        command, env = script_command(script_file)
+        end_boot_deadline()
+        GOVERNOR.report()
+        steps = auto_input_steps()
+        LOG.boot_summary(script_file)
+        if RESTART_POLICY not in ("no", "on-failure", "always"):
+            LOG.warning(f"Unknown restart policy '{RESTART_POLICY}'. The script will not be restarted.")
+        elif HANDOFF_MODE and RESTART_POLICY != "no":
+            LOG.warning(f"Restart policy '{RESTART_POLICY}' keeps the launcher running; ignoring handoff mode '{HANDOFF_MODE}'.")
+        elif HANDOFF_MODE and steps:
+            # Once handed off nothing watches the output, so the answers could only be sent blind.
+            LOG.warning(f"Launch profile '{LAUNCH_PROFILE}' answers the script's prompts from the launcher; "
+                        f"ignoring handoff mode '{HANDOFF_MODE}'.")
+        elif HANDOFF_MODE:
+            hand_off(command, env, script_file)
+        PROFILER.finish()
+        LOG.flush()
+        tee = ConsoleTee() if CONSOLE_LOG or CONSOLE_RATE > 0 else None
+        if SAMPLE_INTERVAL > 0:
+            sampler = ProcessSampler(SAMPLE_INTERVAL, SAMPLE_SUMMARY_INTERVAL)
+            sampler.start()
+        # Output that goes through the pump still reaches a terminal as a terminal.
+        use_pty = USE_PTY or (tee is not None and sys.stdout.isatty())
+        restarts = 0
+        while True:
+            started = time.monotonic()
+            if steps or use_pty or tee is not None:
+                exit_code = run_pumped(command, env, AutoInput(steps) if steps else None, use_pty, tee)
+                if tee is not None and exit_code != 0:
+                    tee.save_crash_report(exit_code)
+            else:
+                exit_code = subprocess.run(command, env=env).returncode
+            LOG.info(f"'{name}' finished with exit code {exit_code}.")
+            if time.monotonic() - started >= RESTART_RESET_AFTER:
+                restarts = 0
+            delay = restart_delay(exit_code, restarts)
+            if delay is None:
+                break
+            restarts += 1
+            LOG.warning(f"Restarting '{name}' in {delay:.0f}s (restart {restarts}"
+                        f"{f'/{RESTART_MAX}' if RESTART_MAX > 0 else ''}, policy {RESTART_POLICY})...")
+            LOG.flush()
+            time.sleep(delay)
+
+        if exit_code == 0:
+            LOG.info("Script completed successfully. Exiting program...")
+            sys.exit(0)
+    except KeyboardInterrupt:
+        LOG.warning("Script execution interrupted.")
+    except Exception as e:
+        LOG.error(f"Exception while trying to run script '{name}': {e}")
+        LOG.traceback()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if tee is not None:
+            tee.close()
+
+def restart_delay(exit_code: int, restarts: int) -> float | None:
+    """Seconds to wait before restarting after exit_code, or None to stop.
+
+    restarts counts the restarts since the script last stayed up for
+    RESTART_RESET_AFTER seconds: the first is immediate, later ones back off
+    exponentially. A script stopped by SIGINT or SIGTERM (directly or via a
+    shell's 128+n status) was asked to stop and is never restarted.
+    """
+    import signal
+    if RESTART_POLICY == "always":
+        wanted = True
+    elif RESTART_POLICY == "on-failure":
+        wanted = exit_code != 0
+    else:
+        wanted = False
+    if not wanted or -exit_code in (signal.SIGINT, signal.SIGTERM) or exit_code - 128 in (signal.SIGINT, signal.SIGTERM):
+        return None
+    if RESTART_MAX > 0 and restarts >= RESTART_MAX:
+        LOG.error(f"Giving up after {restarts} restarts in a row (policy {RESTART_POLICY}).")
+        return None
+    return 0.0 if restarts == 0 else min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * 2 ** (restarts - 1))
+
+SUPERVISOR_SOURCE = r'''
+import os, signal, sys
+
+name, launcher_rss_kb, command = sys.argv[1], int(sys.argv[2]), sys.argv[3:]
+pid = os.fork()
+if pid == 0:
+    try:
+        os.execvp(command[0], command)
+    finally:
+        os._exit(127)
+
+def forward(signum, frame):
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
+
+# SIGINT is left to the process group, exactly as with the full launcher.
+signal.signal(signal.SIGINT, signal.SIG_IGN)
+for signum in (signal.SIGTERM, signal.SIGHUP, signal.SIGQUIT, signal.SIGUSR1, signal.SIGUSR2):
+    signal.signal(signum, forward)
+
+rss_kb = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss_kb = int(line.split()[1])
+print(f"Supervisor RSS {rss_kb / 1024:.1f} MB, launcher was {launcher_rss_kb / 1024:.1f} MB "
+      f"({(launcher_rss_kb - rss_kb) / 1024:.1f} MB saved).", flush=True)
+
+_, status = os.waitpid(pid, 0)
+code = os.waitstatus_to_exitcode(status)
+print(f"'{name}' finished with exit code {code}.", flush=True)
+if code < 0:
+    signal.signal(-code, signal.SIG_DFL)
+    os.kill(os.getpid(), -code)
+sys.exit(code)
+'''
+
+def hand_off(command: list[str], env: dict | None, script_file: str) -> None:
+    """Replace the launcher with the script, or with a minimal supervisor for it.
+
+    In "exec" mode the script takes over this PID, so signals and the exit
+    code are the script's own. In "supervisor" mode a bare `python -S -I`
+    process forks the script, forwards signals and reports its exit code.
+    Only returns if the handoff could not be started.
+    """
+    name = os.path.basename(script_file)
+    rss_kb = current_rss_kb()
+    if HANDOFF_MODE == "supervisor":
+        argv = [sys.executable, "-S", "-I", "-c", SUPERVISOR_SOURCE, name, str(rss_kb), *command]
+        LOG.info(f"Handing off '{name}' to a minimal supervisor (launcher RSS {rss_kb / 1024:.1f} MB)...")
+    elif HANDOFF_MODE == "exec":
+        argv = command
+        LOG.info(f"Handing off to '{name}' via exec, releasing {rss_kb / 1024:.1f} MB of launcher RSS...")
+    else:
+        LOG.warning(f"Unknown handoff mode '{HANDOFF_MODE}'. Running '{name}' under the launcher instead.")
+        return
+
+    PROFILER.finish()
+    pool = sys.modules.get(__package__ + ".pool")
+    if pool is not None:
+        pool.HTTP_POOL.close()
+    LOG.flush()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        os.execvpe(argv[0], argv, os.environ if env is None else env)
+    except OSError as e:
+        LOG.warning(f"Handoff failed: {e}. Running '{name}' under the launcher instead.")
+
+def current_rss_kb() -> int:
+    try:
+        with open("/proc/self/status", 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return 0
+
+def run_pumped(command: list[str], env: dict | None, auto_input=None, use_pty: bool = False, tee=None) -> int:
+    """Run command and pump our stdin (and, with a PTY, its output) through a selector loop.
+
+    Without a PTY, auto-input or a console tee the child writes straight to
+    our stdout and only input is forwarded, spliced kernel-side where possible.
+    With a PTY the child gets a real terminal, our terminal is put in raw mode
+    and window-size changes are propagated. An AutoInput engine sees all of
+    the child's output (which is then always pumped through us) and its
+    responses are queued ahead of anything typed. A ConsoleTee likewise
+    sees all output and decides what reaches our stdout. EOF on our stdin stops
+    input forwarding but is not passed on to the child, as with the old
+    thread pump.
+    """
+    import subprocess
+    import selectors
+    import signal
+    import pty
+    import tty
+    import termios
+    sys.stdout.flush()
+    stdin_fd = sys.stdin.fileno() if sys.stdin is not None else None
+    stdout_fd = sys.stdout.fileno()
+    saved_tty = None
+    previous_winch = None
+
+    if use_pty:
+        master_fd, slave_fd = pty.openpty()
+        copy_window_size(stdout_fd, master_fd)
+        process = subprocess.Popen(command, env=env, stdin=slave_fd, stdout=slave_fd, stderr=slave_fd,
+                                   start_new_session=True, preexec_fn=acquire_controlling_tty)
+        os.close(slave_fd)
+        child_in_fd = child_out_fd = master_fd
+        if stdin_fd is not None and os.isatty(stdin_fd):
+            saved_tty = termios.tcgetattr(stdin_fd)
+            tty.setraw(stdin_fd)
+        previous_winch = signal.signal(signal.SIGWINCH, lambda signum, frame: copy_window_size(stdout_fd, master_fd))
+    elif auto_input is not None or tee is not None:
+        process = subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        child_in_fd, child_out_fd = process.stdin.fileno(), process.stdout.fileno()
+        os.set_blocking(child_out_fd, False)
+    else:
+        process = subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=sys.stdout, stderr=subprocess.STDOUT)
+        child_in_fd, child_out_fd = process.stdin.fileno(), None
+    os.set_blocking(child_in_fd, False)
+
+    to_child = bytearray()
+    to_stdout = bytearray()
+    stdin_open = stdin_fd is not None
+    child_out_open = child_out_fd is not None
+    splice_stdin = hasattr(os, "splice") and not use_pty
+    selector = selectors.DefaultSelector()
+    registered = {}
+
+    # Regular files and /dev/null cannot be polled but never block; treat them as always ready.
+    always_ready = set()
+    for fd in (stdin_fd, stdout_fd):
+        if fd is not None:
+            try:
+                selector.register(fd, selectors.EVENT_READ if fd == stdin_fd else selectors.EVENT_WRITE)
+                selector.unregister(fd)
+            except (PermissionError, ValueError):
+                always_ready.add(fd)
+
+    try:
+        while process.poll() is None:
+            interest = {}
+            if stdin_open and len(to_child) < PUMP_BUFSIZE:
+                interest[stdin_fd] = selectors.EVENT_READ
+            if child_out_open and len(to_stdout) < PUMP_BUFSIZE:
+                interest[child_out_fd] = selectors.EVENT_READ
+            if to_child:
+                interest[child_in_fd] = interest.get(child_in_fd, 0) | selectors.EVENT_WRITE
+            if to_stdout:
+                interest[stdout_fd] = interest.get(stdout_fd, 0) | selectors.EVENT_WRITE
+            synthesized = {fd: interest.pop(fd) for fd in always_ready if fd in interest}
+            for fd in list(registered):
+                if fd not in interest:
+                    selector.unregister(fd)
+                    del registered[fd]
+            for fd, mask in interest.items():
+                if fd not in registered:
+                    selector.register(fd, mask)
+                elif registered[fd] != mask:
+                    selector.modify(fd, mask)
+                registered[fd] = mask
+
+            timeout = 0 if synthesized else PUMP_POLL_INTERVAL
+            if auto_input is not None and (deadline := auto_input.next_deadline()) is not None:
+                timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+            ready = dict(synthesized)
+            for key, mask in selector.select(timeout=timeout):
+                ready[key.fd] = ready.get(key.fd, 0) | mask
+
+            if ready.get(child_out_fd, 0) & selectors.EVENT_READ:
+                data = read_child_output(child_out_fd)
+                if data:
+                    to_stdout += data if tee is None else tee.feed(data)
+                    if auto_input is not None:
+                        auto_input.feed(data)
+                elif data is not None:
+                    child_out_open = False
+            if auto_input is not None and not auto_input.done:
+                to_child += auto_input.poll()
+            if tee is not None:
+                to_stdout += tee.poll()
+            if ready.get(stdout_fd, 0) & selectors.EVENT_WRITE:
+                del to_stdout[:os.write(stdout_fd, to_stdout)]
+            if ready.get(stdin_fd, 0) & selectors.EVENT_READ:
+                forwarded = False
+                if splice_stdin and not to_child:
+                    try:
+                        if os.splice(stdin_fd, child_in_fd, PUMP_BUFSIZE) == 0:
+                            stdin_open = False
+                        forwarded = True
+                    except BlockingIOError:
+                        pass  # child pipe is full; buffer instead and wait for it
+                    except OSError:
+                        splice_stdin = False
+                if not forwarded:
+                    data = os.read(stdin_fd, PUMP_BUFSIZE)
+                    if data:
+                        to_child += data
+                    else:
+                        stdin_open = False
+            if ready.get(child_in_fd, 0) & selectors.EVENT_WRITE:
+                try:
+                    del to_child[:os.write(child_in_fd, to_child)]
+                except BlockingIOError:
+                    pass
+                except OSError:
+                    to_child.clear()  # the child closed its stdin
+                    stdin_open = False
+
+        # The child is gone: flush whatever it left in the PTY before returning.
+        while child_out_open and (data := read_child_output(child_out_fd)):
+            to_stdout += data if tee is None else tee.feed(data)
+        if tee is not None:
+            to_stdout += tee.poll(final=True)
+        if to_stdout:
+            os.write(stdout_fd, to_stdout)
+        return process.wait()
+    finally:
+        selector.close()
+        if saved_tty is not None:
+            termios.tcsetattr(stdin_fd, termios.TCSAFLUSH, saved_tty)
+        if previous_winch is not None:
+            signal.signal(signal.SIGWINCH, previous_winch)
+        if use_pty:
+            os.close(master_fd)
+
+def read_child_output(fd: int) -> bytes | None:
+    # None means nothing is available yet; b"" means the child side is closed.
+    try:
+        return os.read(fd, PUMP_BUFSIZE)
+    except BlockingIOError:
+        return None
+    except OSError:
+        return b""  # EIO once the child side of the PTY is gone
+
+def acquire_controlling_tty() -> None:
+    # Runs in the child after setsid(): make the PTY slave its controlling terminal.
+    import termios
+    import fcntl
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+def copy_window_size(source_fd: int, target_fd: int) -> None:
+    import struct
+    import termios
+    import fcntl
+    try:
+        size = fcntl.ioctl(source_fd, termios.TIOCGWINSZ, b"\0" * 8)
+    except OSError:
+        size = struct.pack("HHHH", 24, 80, 0, 0)
+    try:
+        fcntl.ioctl(target_fd, termios.TIOCSWINSZ, size)
+    except OSError:
+        pass
+
+def auto_input_steps() -> list[tuple[str | None, bytes, float]]:
+    """Return the auto-input steps, from NOUR_AUTO_INPUT (a JSON list of
+    [pattern, response, timeout] entries) if set, else the launch profile's."""
+    steps = LAUNCH_PROFILES.get(LAUNCH_PROFILE, [])
+    override = os.environ.get(AUTO_INPUT_ENV, "")
+    if override:
+        try:
+            steps = [(step[0], step[1], float(step[2]) if len(step) > 2 else 60.0) for step in json.loads(override)]
+        except (ValueError, TypeError, IndexError) as e:
+            LOG.warning(f"Ignoring invalid {AUTO_INPUT_ENV}: {e}")
+    return [(pattern, response.encode('utf-8'), timeout) for pattern, response, timeout in steps]
+
+class AutoInput:
+    """Answer the child's prompts in order, expect-style.
+
+    Each step waits for the child's output (with terminal escapes stripped)
+    to match its pattern and go quiet for AUTO_INPUT_SETTLE seconds, then
+    sends its response; output seen before that response never satisfies a
+    later step. The pattern is searched once per burst of output, and only
+    over its last AUTO_INPUT_LINES lines, so a chatty child costs little.
+    A step whose timeout runs out sends its response blindly so a
+    prompt we failed to recognise cannot stall an unattended boot, and a step
+    without a pattern is sent as soon as it is reached.
+    """
+
+    ESCAPES = r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)?|[@-Z\\-_])|\r"
+
+    def __init__(self, steps: list[tuple[str | None, bytes, float]]):
+        import re
+        import codecs
+        self.steps = [(re.compile(pattern) if pattern else None, response, timeout)
+                      for pattern, response, timeout in steps]
+        self.index = 0
+        self.output = ""
+        self.searched = False
+        self.escapes = re.compile(self.ESCAPES)
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.step_started = self.last_output = time.monotonic()
+
+    @property
+    def done(self) -> bool:
+        return self.index >= len(self.steps)
+
+    def feed(self, data: bytes) -> None:
+        if self.done:
+            return
+        text = self.escapes.sub("", self.decoder.decode(data))
+        if text:
+            self.output = (self.output + text)[-AUTO_INPUT_WINDOW:]
+            self.last_output = time.monotonic()
+            self.searched = False
+
+    def poll(self) -> bytes:
+        # Return the responses that are due now, advancing past their steps.
+        now = time.monotonic()
+        due = bytearray()
+        while not self.done:
+            pattern, response, timeout = self.steps[self.index]
+            prompted = pattern is None or (now - self.last_output >= AUTO_INPUT_SETTLE and self.prompted(pattern))
+            if not prompted and now - self.step_started < timeout:
+                break
+            due += response
+            self.index += 1
+            self.output = ""
+            self.searched = False
+            self.step_started = now
+        return bytes(due)
+
+    def prompted(self, pattern) -> bool:
+        # A quiet child is polled every PUMP_POLL_INTERVAL; output already searched cannot match now.
+        if self.searched:
+            return False
+        self.searched = True
+        return pattern.search("\n".join(self.output.split("\n")[-AUTO_INPUT_LINES:])) is not None
+
+    def next_deadline(self) -> float | None:
+        if self.done:
+            return None
+        deadline = self.step_started + self.steps[self.index][2]
+        if self.output:
+            deadline = min(deadline, self.last_output + AUTO_INPUT_SETTLE)
+        return deadline
+
+class ConsoleTee:
+    """Tee the child's output to a rotating log and a ring buffer, rate-limiting the console copy.
+
+    Everything is written to CONSOLE_LOG, rotated once it passes
+    CONSOLE_LOG_SIZE, and the last CONSOLE_RING_SIZE bytes are kept in
+    memory. The console gets whole lines from a token bucket of CONSOLE_RATE
+    bytes per second with CONSOLE_BURST of slack; lines over the budget are
+    dropped from the console only, and at most once per
+    CONSOLE_NOTICE_INTERVAL a single notice line says how much was held back.
+    Memory use is fixed whatever the child writes.
+    """
+
+    def __init__(self):
+        self.ring = bytearray()
+        self.tokens = float(CONSOLE_BURST)
+        self.refilled = self.last_notice = time.monotonic()
+        self.suppressed_lines = 0
+        self.suppressed_bytes = 0
+        self.dropping_line = False
+        self.at_line_start = True
+        self.log = None
+        self.log_size = 0
+        if CONSOLE_LOG:
+            self.open_log()
+
+    def open_log(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(CONSOLE_LOG) or ".", exist_ok=True)
+            self.log = open(CONSOLE_LOG, 'ab')
+            self.log_size = self.log.tell()
+        except OSError as e:
+            LOG.warning(f"Could not open console log '{CONSOLE_LOG}': {e}")
+            self.log = None
+
+    def rotate_log(self) -> None:
+        self.log.close()
+        try:
+            for index in range(CONSOLE_LOG_BACKUPS, 0, -1):
+                source = CONSOLE_LOG if index == 1 else f"{CONSOLE_LOG}.{index - 1}"
+                if os.path.exists(source):
+                    os.replace(source, f"{CONSOLE_LOG}.{index}")
+        except OSError as e:
+            LOG.warning(f"Could not rotate console log '{CONSOLE_LOG}': {e}")
+        self.open_log()
+
+    def feed(self, data: bytes) -> bytes:
+        """Record data and return the part of it that should reach the console."""
+        if self.log is not None:
+            try:
+                self.log.write(data)
+                self.log_size += len(data)
+                if self.log_size >= CONSOLE_LOG_SIZE:
+                    self.rotate_log()
+            except OSError as e:
+                LOG.warning(f"Could not write console log '{CONSOLE_LOG}': {e}")
+                self.log = None
+        self.ring += data
+        if len(self.ring) > CONSOLE_RING_SIZE:
+            del self.ring[:len(self.ring) - CONSOLE_RING_SIZE]
+        if CONSOLE_RATE <= 0:
+            return data
+
+        now = time.monotonic()
+        self.tokens = min(CONSOLE_BURST, self.tokens + (now - self.refilled) * CONSOLE_RATE)
+        self.refilled = now
+        start = 0
+        if self.dropping_line:
+            # The rest of a line whose start was already held back.
+            start = data.find(b"\n") + 1
+            self.suppressed_bytes += start or len(data)
+            if not start:
+                return b""
+            self.dropping_line = False
+        if len(data) - start <= self.tokens:
+            passed = data[start:]
+        else:
+            cut = data.rfind(b"\n", start, start + int(self.tokens)) + 1 or start
+            passed = data[start:cut]
+            dropped = data[cut:]
+            self.suppressed_lines += dropped.count(b"\n") + (not dropped.endswith(b"\n"))
+            self.suppressed_bytes += len(dropped)
+            self.dropping_line = not dropped.endswith(b"\n")
+        self.tokens -= len(passed)
+        if passed:
+            self.at_line_start = passed.endswith(b"\n")
+        return passed + self.poll()
+
+    def poll(self, final: bool = False) -> bytes:
+        # The notice about held-back output, once it is due.
+        if not self.suppressed_lines or (not final and time.monotonic() - self.last_notice < CONSOLE_NOTICE_INTERVAL):
+            return b""
+        where = f"; full output in {CONSOLE_LOG}" if self.log is not None else ""
+        notice = ("" if self.at_line_start else "\n") + (f"[launcher] {self.suppressed_lines} lines "
+                  f"({self.suppressed_bytes} bytes) of output held back from the console{where}\n")
+        self.suppressed_lines = self.suppressed_bytes = 0
+        self.last_notice = time.monotonic()
+        self.at_line_start = True
+        return notice.encode('utf-8')
+
+    def close(self) -> None:
+        if self.log is not None:
+            try:
+                self.log.close()
+            except OSError:
+                pass
+            self.log = None
+
+    def save_crash_report(self, exit_code: int) -> None:
+        # The ring then starts over, so a later report covers only the run that crashed.
+        if self.log is not None:
+            try:
+                self.log.flush()
+            except OSError:
+                pass
+        try:
+            os.makedirs(os.path.dirname(CRASH_REPORT) or ".", exist_ok=True)
+            with open(CRASH_REPORT, 'wb') as f:
+                f.write(f"exit code {exit_code} at {time.strftime('%Y-%m-%d %H:%M:%S')}; "
+                        f"last {len(self.ring)} bytes of output:\n".encode('utf-8'))
+                f.write(self.ring)
+            LOG.warning(f"Saved the last {len(self.ring)} bytes of output to '{CRASH_REPORT}'.")
+        except OSError as e:
+            LOG.warning(f"Could not write crash report '{CRASH_REPORT}': {e}")
+        self.ring.clear()
+
+class ProcessSampler:
+    """Sample the launcher's descendant processes from /proc on a background thread.
+
+    Every interval the tree below this process is found from each process's
+    parent PID, and CPU time, RSS, PSS, I/O bytes and thread counts are read
+    for each member. CPU is attributed per (pid, start time), so a process
+    that exits between samples keeps the CPU seen up to its last sample;
+    once it is gone its counters are folded into its command's totals, so
+    only live processes are tracked however many commands the script runs.
+    Summaries are logged every summary_interval seconds; stop() logs and
+    writes the peaks, per command and for the tree as a whole. Files a
+    process does not let us read (another user's io) simply count as zero.
+
+    Only processes whose parent chain reaches the launcher are seen: a
+    daemon that double-forks is reparented to init (or the container's
+    PID 1) and drops out of the samples, along with its CPU from then on.
+    """
+
+    def __init__(self, interval: float, summary_interval: float):
+        self.interval = interval
+        self.summary_interval = summary_interval
+        self.clock_ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self.processes = {}
+        self.exited = {}
+        self.commands = {}
+        self.peak = {"processes": 0, "threads": 0, "rss": 0, "pss": 0, "cpu_percent": 0.0}
+        self.current = {}
+        self.samples = 0
+        self.sample_seconds = 0.0
+        self.started = self.last_sample = time.monotonic()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="process-sampler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.thread.join()
+        report = self.report()
+        try:
+            os.makedirs(os.path.dirname(SAMPLE_REPORT) or ".", exist_ok=True)
+            with open(SAMPLE_REPORT, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+        except OSError as e:
+            LOG.warning(f"Could not write process report '{SAMPLE_REPORT}': {e}")
+        peak = report["peak"]
+        top = max(report["commands"].items(), key=lambda item: item[1]["cpu_seconds"], default=None)
+        busiest = f"; most CPU: {top[0]} {top[1]['cpu_seconds']:.1f}s" if top else ""
+        LOG.info(f"Process tree peaks over {report['duration']:.0f}s: {peak['processes']} processes, "
+                 f"{peak['threads']} threads, CPU {peak['cpu_percent']:.0f}%, RSS {peak['rss'] / 2 ** 20:.1f} MB, "
+                 f"PSS {peak['pss'] / 2 ** 20:.1f} MB{busiest} -> {SAMPLE_REPORT}")
+
+    def run(self) -> None:
+        last_summary = time.monotonic()
+        while not self.stopping.wait(self.interval):
+            self.sample()
+            if time.monotonic() - last_summary >= self.summary_interval:
+                last_summary = time.monotonic()
+                self.log_summary()
+
+    def descendants(self) -> list[int]:
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", 'rb') as f:
+                    ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+        tree, pending = [], list(children.get(os.getpid(), []))
+        while pending:
+            pid = pending.pop()
+            tree.append(pid)
+            pending.extend(children.get(pid, []))
+        return tree
+
+    def read_process(self, pid: int) -> dict | None:
+        try:
+            with open(f"/proc/{pid}/stat", 'rb') as f:
+                stat = f.read()
+        except OSError:
+            return None
+        name = stat[stat.find(b"(") + 1:stat.rfind(b")")].decode('utf-8', 'replace')
+        fields = stat.rsplit(b")", 1)[1].split()
+        process = {
+            "name": name,
+            "start": int(fields[19]),
+            "cpu_ticks": int(fields[11]) + int(fields[12]),
+            "threads": int(fields[17]),
+            "rss": int(fields[21]) * self.page_size,
+            "pss": 0,
+            "read_bytes": 0,
+            "write_bytes": 0,
+        }
+        try:
+            with open(f"/proc/{pid}/smaps_rollup", 'rb') as f:
+                for line in f:
+                    if line.startswith(b"Pss:"):
+                        process["pss"] = int(line.split()[1]) * 1024
+                        break
+        except (OSError, ValueError):
+            pass
+        try:
+            with open(f"/proc/{pid}/io", 'rb') as f:
+                for line in f:
+                    key, _, value = line.partition(b":")
+                    if key in (b"read_bytes", b"write_bytes"):
+                        process[key.decode()] = int(value)
+        except (OSError, ValueError):
+            pass
+        return process
+
+    def sample(self) -> None:
+        started = time.monotonic()
+        current = {}
+        cpu_delta = 0
+        for pid in self.descendants():
+            process = self.read_process(pid)
+            if process is None:
+                continue
+            key = (pid, process["start"])
+            previous = self.processes.get(key)
+            cpu_delta += process["cpu_ticks"] - (previous["cpu_ticks"] if previous else 0)
+            current[key] = process
+        for key in self.processes.keys() - current.keys():
+            self.fold_exited(self.processes[key])
+        self.processes = current
+
+        elapsed = started - self.last_sample
+        self.last_sample = started
+        totals = {
+            "processes": len(current),
+            "threads": sum(process["threads"] for process in current.values()),
+            "rss": sum(process["rss"] for process in current.values()),
+            "pss": sum(process["pss"] for process in current.values()),
+            "cpu_percent": 100.0 * cpu_delta / self.clock_ticks / elapsed if elapsed > 0 else 0.0,
+        }
+        for name, value in totals.items():
+            self.peak[name] = max(self.peak[name], value)
+        by_command = {}
+        for process in current.values():
+            command = by_command.setdefault(process["name"], {"processes": 0, "threads": 0, "rss": 0, "pss": 0})
+            command["processes"] += 1
+            for name in ("threads", "rss", "pss"):
+                command[name] += process[name]
+        for name, command in by_command.items():
+            peak = self.commands.setdefault(name, dict.fromkeys(command, 0))
+            for field, value in command.items():
+                peak[field] = max(peak[field], value)
+        self.current = totals
+        self.samples += 1
+        self.sample_seconds += time.monotonic() - started
+
+    def fold_exited(self, process: dict) -> None:
+        totals = self.exited.setdefault(process["name"], {"cpu_ticks": 0, "read_bytes": 0, "write_bytes": 0})
+        for field in totals:
+            totals[field] += process[field]
+
+    def log_summary(self) -> None:
+        current = self.current
+        if not current:
+            return
+        LOG.info(f"Process tree: {current['processes']} processes, {current['threads']} threads, "
+                 f"CPU {current['cpu_percent']:.0f}%, RSS {current['rss'] / 2 ** 20:.1f} MB, "
+                 f"PSS {current['pss'] / 2 ** 20:.1f} MB.")
+
+    def report(self) -> dict:
+        commands = {name: {"peak_" + field: value for field, value in peak.items()}
+                    for name, peak in self.commands.items()}
+        totals = {name: dict(exited) for name, exited in self.exited.items()}
+        for process in self.processes.values():
+            command = totals.setdefault(process["name"], {"cpu_ticks": 0, "read_bytes": 0, "write_bytes": 0})
+            for field in command:
+                command[field] += process[field]
+        for name, total in totals.items():
+            command = commands.setdefault(name, {})
+            command["cpu_seconds"] = total["cpu_ticks"] / self.clock_ticks
+            command["read_bytes"] = total["read_bytes"]
+            command["write_bytes"] = total["write_bytes"]
+        return {
+            "interval": self.interval,
+            "duration": time.monotonic() - self.started,
+            "samples": self.samples,
+            "sample_cost_seconds": self.sample_seconds / self.samples if self.samples else 0.0,
+            "peak": dict(self.peak),
+            "commands": commands,
+        }
+
+def download_file(url: str, destination: str, response=None, source: str | None = None) -> str:
+    """Download url into the artifact cache and materialize it at destination.
+
+    The body is written to a stable partial file under .nour-cache/partial so
+    that an interrupted transfer can be resumed with a Range request guarded
+    by If-Range, both within this call and on the next boot. Large files can
+    optionally be fetched as several parallel byte ranges. response, if given,
+    came from the mirror source; range requests go back to that mirror. A
+    compressed body is decompressed on the fly, so the partial file, the
+    digest and the blob always hold the decoded content.
+    Returns the sha256 digest of the content.
+    """
+    import hashlib
+    import http.client
+    dest_name = os.path.basename(destination)
+    part_path = partial_path(url)
+    state = load_partial(url)
+    hasher = None
+    attempts = 0
+    resumed_at = 0
+
+    try:
+        if response is not None and state is not None and response_validator(response.headers) != state["validator"]:
+            discard_partial(url)
+            state = None
+        if response is not None and state is not None:
+            # A resumable partial of this exact version exists; continue it instead.
+            response.close()
+            response = None
+
+        with GOVERNOR.slot(dest_name):
+            while True:
+                try:
+                    if state is None:
+                        if response is None and source == url:
+                            # The primary answered the update check; a restart must not fall back to a mirror.
+                            response = open_url(url, request_headers({}, url, url))
+                        elif response is None:
+                            source, response = open_hedged(url)
+                        response = decode_response(url, source or url, response)
+                        state = start_partial(url, response, source)
+                        hasher = hashlib.sha256() if len(state["segments"]) == 1 else None
+                        fetch_segments(state["source"], part_path, state, hasher, response)
+                    else:
+                        if hasher is None and len(state["segments"]) == 1:
+                            hasher = hash_file_prefix(part_path, state["segments"][0][2])
+                        if not fetch_segments(state.get("source", url), part_path, state, hasher):
+                            attempts += 1
+                            if attempts > RESUME_ATTEMPTS:
+                                raise IOError("server did not honour the resume request")
+                            LOG.warning(f"Remote '{dest_name}' changed since the partial download. Starting over...")
+                            discard_partial(url)
+                            state, hasher = None, None
+                            continue
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    response = None
+                    received = sum(segment[2] for segment in state["segments"]) if state is not None else 0
+                    if received > resumed_at:
+                        attempts = 0  # bytes arrived since the last failure: a fresh budget and backoff
+                    resumed_at = received
+                    attempts += 1
+                    delay = retry_delay(attempts) if attempts <= RESUME_ATTEMPTS and retryable_error(e) else None
+                    if delay is None:
+                        raise
+                    if state is not None and state["validator"]:
+                        save_partial(url, state)
+                        LOG.warning(f"Download of '{dest_name}' interrupted after {received} bytes ({e}). Resuming in {delay:.1f}s...")
+                    else:
+                        discard_partial(url)
+                        state, hasher = None, None
+                        LOG.warning(f"Download of '{dest_name}' failed ({e}). Retrying in {delay:.1f}s...")
+                    GOVERNOR.sleep(delay)
+
+        size = sum(segment[2] for segment in state["segments"])
+        if state["length"] is not None and size != state["length"]:
+            raise IOError(f"expected {state['length']} bytes but received {size}")
+        if hasher is None:
+            hasher = hash_file_prefix(part_path, size)
+        digest = hasher.hexdigest()
+        os.makedirs(CACHE_BLOBS_DIR, exist_ok=True)
+        if os.path.exists(blob_path(digest)):
+            # Same content again: keep the existing blob and the hardlinks into it.
+            os.remove(part_path)
+        else:
+            os.replace(part_path, blob_path(digest))
+        discard_partial(url)
+        materialize_blob(blob_path(digest), destination)
+        record_artifact(url, destination, digest, size, {"ETag": state["etag"], "Last-Modified": state["last_modified"]},
+                        state.get("source", url))
+        return digest
+    except Exception as e:
+        if state is not None and state["validator"]:
+            save_partial(url, state)
+        else:
+            discard_partial(url)
+        raise IOError(f"Failed to download or replace file '{dest_name}' from {url}: {e}") from e
+
+def partial_path(url: str) -> str:
+    import hashlib
+    return os.path.join(CACHE_PARTIAL_DIR, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + ".part")
+
+def load_partial(url: str) -> dict | None:
+    part_path = partial_path(url)
+    try:
+        with open(part_path + ".json", 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        part_size = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("url") != url or not state.get("validator"):
+        return None
+    if any(segment[0] + segment[2] > part_size for segment in state.get("segments", [])):
+        return None
+    return state
+
+def save_partial(url: str, state: dict) -> None:
+    try:
+        with open(partial_path(url) + ".json", 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+    except OSError as e:
+        LOG.warning(f"Could not save partial download state for {url}: {e}")
+
+def discard_partial(url: str) -> None:
+    part_path = partial_path(url)
+    for path in (part_path, part_path + ".json"):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def response_validator(headers) -> str | None:
+    # Weak ETags cannot guard a byte range, so fall back to Last-Modified.
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+def start_partial(url: str, response, source: str | None = None) -> dict:
+    headers = response.headers
+    # A compressed body's length and validator do not describe the decoded bytes we store.
+    encoded = isinstance(response, DecodedResponse)
+    length = headers.get("Content-Length")
+    length = int(length) if length and length.isdigit() and not encoded else None
+    validator = None if encoded else response_validator(headers)
+
+    segment_count = 1
+    if (DOWNLOAD_SEGMENTS > 1 and validator and length is not None and length >= SEGMENT_MIN_SIZE
+            and headers.get("Accept-Ranges", "").lower() == "bytes"):
+        segment_count = DOWNLOAD_SEGMENTS
+    if length is None:
+        segments = [[0, None, 0]]
+    else:
+        bounds = [length * i // segment_count for i in range(segment_count + 1)]
+        segments = [[bounds[i], bounds[i + 1], 0] for i in range(segment_count)]
+
+    os.makedirs(CACHE_PARTIAL_DIR, exist_ok=True)
+    with open(partial_path(url), 'wb') as f:
+        if length is not None and segment_count > 1:
+            f.truncate(length)
+    return {
+        "url": url,
+        "source": source or url,
+        "validator": validator,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "length": length,
+        "segments": segments,
+    }
+
+def mirror_urls(url: str) -> list[str]:
+    """url and its configured mirrors, fastest first by the persisted latency stats."""
+    import urllib.parse
+    parsed = urllib.parse.urlsplit(url)
+    mirrors = [url]
+    for base in MIRRORS:
+        if base == "jsdelivr":
+            # raw.githubusercontent.com/<owner>/<repo>/[refs/heads/]<ref>/<path>
+            parts = parsed.path.strip("/").split("/")
+            if parsed.hostname == "raw.githubusercontent.com" and len(parts) >= 4:
+                if parts[2:4] == ["refs", "heads"] and len(parts) >= 6:
+                    parts = parts[:2] + parts[4:]
+                mirror = f"https://cdn.jsdelivr.net/gh/{parts[0]}/{parts[1]}@{parts[2]}/{'/'.join(parts[3:])}"
+            else:
+                continue
+        elif base.endswith("#xz"):
+            mirror = rebase_url(base[:-3], url) + ".xz"
+        else:
+            mirror = rebase_url(base, url)
+        if mirror not in mirrors:
+            mirrors.append(mirror)
+    # Mirrors without stats count as HEDGE_DELAY slow: behind known-fast ones, otherwise in listed order.
+    stats = load_mirror_stats()
+    return sorted(mirrors, key=lambda mirror: stats.get(mirror_origin(mirror), {}).get("latency", HEDGE_DELAY))
+
+def open_hedged(url: str, entry: dict | None = None):
+    """Open url on whichever of its mirrors answers first; returns (mirror, response).
+
+    The preferred mirror is asked first. The next one is asked as soon as the
+    previous fails, or once it has gone a hedge delay without response
+    headers: three times its usual latency, clamped to HEDGE_MIN_DELAY and
+    HEDGE_DELAY. The first response (or 304) wins and late ones are closed.
+    Conditional headers come from entry's validators for each mirror, and
+    every request offers the compressed encodings decode_response handles.
+    Content is verified by digest when it lands in the cache, whichever
+    mirror served it. Raises the first mirror's error if all of them fail.
+
+    Mirrors only race for content we do not have yet. Once entry holds a
+    cached version only url itself is asked, since a mirror lagging behind
+    it would answer an update check with an older version that its digest
+    cannot tell apart from a newer one.
+    """
+    import urllib.error
+    mirrors = mirror_urls(url)
+    entry = entry or {}
+    if len(mirrors) == 1 or entry.get("digest"):
+        return url, open_url(url, request_headers(entry, url, url))
+
+    lock = threading.Lock()
+    answered = threading.Event()
+    outcome = {"winner": None, "errors": [], "in_flight": 0}
+
+    def attempt(mirror: str) -> None:
+        started = time.monotonic()
+        result, error = None, None
+        try:
+            result = open_url(mirror, request_headers(entry, url, mirror))
+        except urllib.error.HTTPError as e:
+            result = e if e.code == 304 else None
+            error = None if e.code == 304 else e
+            if error is not None:
+                e.close()
+        except (urllib.error.URLError, OSError) as e:
+            error = e
+        record_mirror_latency(mirror, time.monotonic() - started if result is not None else None)
+        with lock:
+            outcome["in_flight"] -= 1
+            if result is not None and outcome["winner"] is None:
+                outcome["winner"] = (mirror, result)
+                result = None
+            elif error is not None:
+                outcome["errors"].append(error)
+            answered.set()
+        if result is not None:
+            result.close()
+
+    stats = load_mirror_stats()
+    launched = 0
+    while True:
+        with lock:
+            answered.clear()
+            if outcome["winner"] is not None:
+                break
+            if launched == len(mirrors):
+                if outcome["in_flight"] == 0:
+                    raise outcome["errors"][0]
+                delay = None
+            else:
+                if launched:
+                    LOG.debug(f"Hedging '{os.path.basename(url)}' with a request to {mirror_origin(mirrors[launched])}...")
+                outcome["in_flight"] += 1
+                threading.Thread(target=attempt, args=(mirrors[launched],), daemon=True).start()
+                latency = stats.get(mirror_origin(mirrors[launched]), {}).get("latency")
+                delay = HEDGE_DELAY if latency is None else min(HEDGE_DELAY, max(HEDGE_MIN_DELAY, 3 * latency))
+                launched += 1
+        answered.wait(delay)
+
+    mirror, result = outcome["winner"]
+    if isinstance(result, urllib.error.HTTPError):
+        raise result
+    return mirror, result
+
+def request_headers(entry: dict, url: str, mirror: str) -> dict:
+    return dict(validator_headers(entry, url, mirror), **{"Accept-Encoding": accept_encoding()})
+
+def accept_encoding() -> str:
+    global ACCEPT_ENCODING
+    if ACCEPT_ENCODING is None:
+        offered = [encoding for encoding in CONTENT_ENCODINGS if content_decoder(encoding) is not None]
+        ACCEPT_ENCODING = ", ".join(offered + ["identity;q=0.5"])
+    return ACCEPT_ENCODING
+
+def content_decoder(encoding: str):
+    """A streaming decompressor for encoding, or None if it is not supported here.
+
+    gzip and xz come from the standard library; zstd needs Python 3.14's
+    compression.zstd or the zstandard package, br the brotli package.
+    """
+    if encoding in ("gzip", "x-gzip"):
+        import zlib
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "xz":
+        import lzma
+        return lzma.LZMADecompressor()
+    if encoding == "zstd":
+        try:
+            from compression import zstd
+            return zstd.ZstdDecompressor()
+        except ImportError:
+            pass
+        try:
+            import zstandard
+        except ImportError:
+            return None
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "br":
+        try:
+            import brotli
+        except ImportError:
+            return None
+        return brotli.Decompressor()
+    return None
+
+def decode_response(url: str, source: str, response):
+    """Wrap response in a DecodedResponse if its body is compressed.
+
+    The body is compressed if it carries a Content-Encoding, or if it is the
+    .xz variant of url served by a "#xz" mirror.
+    """
+    encoding = response.headers.get("Content-Encoding", "identity").strip().lower()
+    if encoding == "identity" and source.endswith(".xz") and not url.endswith(".xz"):
+        encoding = "xz"
+    if encoding == "identity":
+        return response
+    decoder = content_decoder(encoding)
+    if decoder is None:
+        response.close()
+        raise IOError(f"unsupported content encoding '{encoding}' from {source}")
+    return DecodedResponse(response, encoding, decoder)
+
+class DecodedResponse:
+    """File-like view of a compressed response body, decompressed as it is read.
+
+    headers are the wire response's, so Content-Length and validators describe
+    the compressed bytes; compressed transfers are therefore never split into
+    ranges or resumed, only restarted.
+    """
+
+    def __init__(self, response, encoding: str, decoder):
+        self._response = response
+        self._decoder = decoder
+        self._decode = getattr(decoder, "decompress", None) or decoder.process
+        self._buffer = b""
+        self.encoding = encoding
+        self.headers = response.headers
+        self.status = response.status
+        self.url = getattr(response, "url", None)
+        self.decoded = 0
+
+    def read(self, amt: int | None = None) -> bytes:
+        import http.client
+        while not self._buffer:
+            chunk = self._response.read(COPY_BUFSIZE)
+            if not chunk:
+                if not getattr(self._decoder, "eof", True):
+                    raise http.client.IncompleteRead(b"")
+                break
+            self._buffer = self._decode(chunk)
+        if amt is None or amt >= len(self._buffer):
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        self.decoded += len(data)
+        return data
+
+    @property
+    def received(self) -> int:
+        return self._response.received
+
+    def close(self) -> None:
+        # Lets the profiler put the decoded size next to the bytes on the wire.
+        self._response.decoded_bytes = self.decoded
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def validator_headers(entry: dict, url: str, mirror: str) -> dict:
+    validators = entry.get("validators")
+    if validators is None:
+        # Entries written before mirrors existed hold the primary URL's validators.
+        validators = {url: entry}
+    validator = validators.get(mirror) or {}
+    headers = {}
+    if validator.get("etag"):
+        headers["If-None-Match"] = validator["etag"]
+    if validator.get("last_modified"):
+        headers["If-Modified-Since"] = validator["last_modified"]
+    return headers
+
+def mirror_origin(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    return f"{scheme}://{rest.split('/', 1)[0]}"
+
+def load_mirror_stats() -> dict:
+    try:
+        with open(MIRROR_STATS, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return stats if isinstance(stats, dict) else {}
+
+def save_mirror_stats(stats: dict) -> None:
+    import tempfile
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, temp_stats_path = tempfile.mkstemp(dir=CACHE_DIR, prefix="mirrors", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=1, sort_keys=True)
+        os.replace(temp_stats_path, MIRROR_STATS)
+    except OSError as e:
+        LOG.warning(f"Could not write mirror stats '{MIRROR_STATS}': {e}")
+        try:
+            os.remove(temp_stats_path)
+        except OSError:
+            pass
+
+def record_mirror_latency(mirror: str, latency: float | None) -> None:
+    """Fold a time-to-headers sample (None for a failure) into the mirror's moving average."""
+    origin = mirror_origin(mirror)
+    with MIRROR_LOCK:
+        stats = load_mirror_stats()
+        current = stats.get(origin) or {}
+        sample = MIRROR_FAILURE_PENALTY if latency is None else latency
+        previous = current.get("latency")
+        stats[origin] = {
+            "latency": sample if previous is None else 0.7 * previous + 0.3 * sample,
+            "samples": current.get("samples", 0) + 1,
+            "failures": current.get("failures", 0) + (latency is None),
+            "updated_at": time.time(),
+        }
+        save_mirror_stats(stats)
+
+def hash_file_prefix(path: str, length: int):
+    import hashlib
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while length > 0 and (chunk := f.read(min(COPY_BUFSIZE, length))):
+            hasher.update(chunk)
+            length -= len(chunk)
+    return hasher
+
+def fetch_segments(url: str, part_path: str, state: dict, hasher=None, response=None) -> bool:
+    """Fill every unfinished segment of state; False if the server ignored If-Range."""
+    import concurrent.futures
+    pending = [segment for segment in state["segments"]
+               if segment[1] is None or segment[0] + segment[2] < segment[1]]
+    if not pending:
+        return True
+    if response is not None:
+        # The initial full-body response feeds the first segment.
+        first = pending.pop(0)
+        if not pending:
+            return fetch_segment(url, part_path, first, state["validator"], hasher, response)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending) + 1) as executor:
+            futures = [executor.submit(fetch_segment, url, part_path, first, state["validator"], hasher, response)]
+            futures += [executor.submit(fetch_segment, url, part_path, segment, state["validator"]) for segment in pending]
+            return all([future.result() for future in futures])
+    if len(pending) == 1:
+        return fetch_segment(url, part_path, pending[0], state["validator"], hasher)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(pending)) as executor:
+        futures = [executor.submit(fetch_segment, url, part_path, segment, state["validator"]) for segment in pending]
+        return all([future.result() for future in futures])
+
+def fetch_segment(url: str, part_path: str, segment: list, validator: str | None, hasher=None, response=None) -> bool:
+    import urllib.error
+    import http.client
+    start, end, received = segment
+    offset = start + received
+    if response is None:
+        range_end = "" if end is None else end - 1
+        try:
+            response = open_url(url, {"Range": f"bytes={offset}-{range_end}", "If-Range": validator})
+        except urllib.error.HTTPError as e:
+            e.close()
+            if e.code == 416:
+                return False
+            raise
+        content_range = response.headers.get("Content-Range", "")
+        if response.status != 206 or not content_range.startswith(f"bytes {offset}-"):
+            response.close()
+            return False
+
+    with response, open(part_path, 'r+b') as out_file:
+        out_file.seek(offset)
+        wire = getattr(response, "received", 0)
+        while end is None or offset < end:
+            check_deadline()
+            chunk = response.read(COPY_BUFSIZE if end is None else min(COPY_BUFSIZE, end - offset))
+            if not chunk:
+                break
+            # Bandwidth is paid for in bytes on the wire, which a compressed body keeps lower.
+            received = getattr(response, "received", wire + len(chunk))
+            GOVERNOR.throttle(received - wire)
+            wire = received
+            out_file.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+            offset += len(chunk)
+            segment[2] += len(chunk)
+    if end is not None and offset < end:
+        raise http.client.IncompleteRead(b"", end - offset)
+    return True
+
+class DeadlineExceeded(TimeoutError):
+    """The boot deadline ran out; never retried."""
+
+def network_time_left() -> float | None:
+    # Seconds left before the boot deadline, or None when no deadline applies.
+    if BOOT_DEADLINE_AT is None:
+        return None
+    return BOOT_DEADLINE_AT - time.monotonic()
+
+def check_deadline() -> None:
+    left = network_time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"boot deadline of {BOOT_DEADLINE:.0f}s exceeded")
+
+def end_boot_deadline() -> None:
+    # The script is starting: later network work (background updates) is bounded by timeouts only.
+    global BOOT_DEADLINE_AT
+    BOOT_DEADLINE_AT = None
+
+def network_timeouts() -> tuple[float, float]:
+    """(connect, read) socket timeouts for a new request, clamped to the boot deadline."""
+    check_deadline()
+    left = network_time_left()
+    if left is None:
+        return CONNECT_TIMEOUT, READ_TIMEOUT
+    return min(CONNECT_TIMEOUT, left), min(READ_TIMEOUT, left)
+
+def retryable_error(error: BaseException) -> bool:
+    """Whether error is a transient network failure worth another attempt."""
+    import socket
+    import urllib.error
+    import http.client
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRY_STATUSES
+    if isinstance(error, urllib.error.URLError):
+        return isinstance(error.reason, BaseException) and retryable_error(error.reason)
+    if isinstance(error, (ConnectionError, TimeoutError, socket.gaierror, http.client.HTTPException)):
+        return True
+    return error.__cause__ is not None and retryable_error(error.__cause__)
+
+def retry_delay(attempt: int) -> float | None:
+    """Full-jitter exponential backoff before retry number attempt; None if it would overrun the deadline."""
+    import random
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    left = network_time_left()
+    if left is not None and delay >= left:
+        return None
+    return delay
+
+def with_retries(operation, description: str):
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except Exception as e:
+            attempt += 1
+            delay = retry_delay(attempt) if attempt <= RETRY_ATTEMPTS and retryable_error(e) else None
+            if delay is None:
+                raise
+            LOG.warning(f"{description} failed ({e}). Retrying in {delay:.1f}s ({attempt}/{RETRY_ATTEMPTS})...")
+            GOVERNOR.sleep(delay)
+
+def rebase_url(base: str, url: str) -> str:
+    # https://host/path as served from a mirror-style base: <base>/host/path
+    import urllib.parse
+    parsed = urllib.parse.urlsplit(url)
+    return f"{base.rstrip('/')}/{parsed.hostname}{parsed.path}"
+
+def open_url(url: str, headers: dict | None = None):
+    # The HTTP stack is only imported once something actually needs the network.
+    from . import pool
+    if ORIGIN_OVERRIDE:
+        url = rebase_url(ORIGIN_OVERRIDE, url)
+    return pool.open_url(url, headers)
+
+class NodeGovernor:
+    """Node-wide cap on concurrent downloads and on their combined bandwidth.
+
+    Launchers on one host cooperate through files in GOVERNOR_DIR. A transfer
+    (an update check and the download it leads to) holds an flock on one of
+    NODE_DOWNLOADS slot files, which the kernel releases if the launcher
+    dies, and pays for every chunk it reads from a token bucket kept in a
+    small state file; a transfer sleeping before a retry gives its slot up
+    until it tries again. The bucket is refilled at
+    NODE_BANDWIDTH bytes per second and may go into debt: a reader takes what
+    it needs and sleeps until the debt would be paid off, so concurrent
+    readers share the rate in order of arrival. The boot's throttled time,
+    while any of its threads was held back, is reported before the script
+    starts, with the waits of each kind summed over threads.
+    """
+
+    def __init__(self):
+        self.waited = {"jitter": 0.0, "slot": 0.0, "bandwidth": 0.0}
+        self.held = 0.0
+        self._holding = 0
+        self._held_since = 0.0
+        self.jittered = False
+        self.disabled = False
+        self._lock = threading.Lock()
+        self._jitter_lock = threading.Lock()
+        self._in_slot = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(GOVERNOR_DIR) and not self.disabled
+
+    def disable(self, error: OSError) -> None:
+        if not self.disabled:
+            self.disabled = True
+            LOG.warning(f"Download governor disabled, '{GOVERNOR_DIR}' is not usable: {error}")
+
+    @contextlib.contextmanager
+    def waiting(self, kind: str):
+        started = time.monotonic()
+        with self._lock:
+            if self._holding == 0:
+                self._held_since = started
+            self._holding += 1
+        try:
+            yield
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                self.waited[kind] += now - started
+                self._holding -= 1
+                if self._holding == 0:
+                    self.held += now - self._held_since
+
+    def throttled(self) -> float:
+        with self._lock:
+            return self.held
+
+    @contextlib.contextmanager
+    def slot(self, name: str):
+        """Hold one of the node's download slots for the duration of a transfer."""
+        if not self.enabled or getattr(self._in_slot, "slots", None):
+            # A download started by an update check runs in the check's slot.
+            yield
+            return
+        self.jitter()
+        try:
+            os.makedirs(GOVERNOR_DIR, exist_ok=True)
+            slots = [open(os.path.join(GOVERNOR_DIR, f"slot-{index}.lock"), 'a') for index in range(max(1, NODE_DOWNLOADS))]
+        except OSError as e:
+            self.disable(e)
+            yield
+            return
+        try:
+            with self.waiting("slot"):
+                self.acquire(slots, name)
+            self._in_slot.slots, self._in_slot.name = slots, name
+            yield
+        finally:
+            self._in_slot.slots = None
+            # Closing the files releases the slot that was held.
+            for slot_file in slots:
+                slot_file.close()
+
+    def acquire(self, slots: list, name: str) -> None:
+        import fcntl
+        import random
+        waiting = False
+        while True:
+            for slot_file in random.sample(slots, len(slots)):
+                try:
+                    fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return
+                except BlockingIOError:
+                    pass
+            left = network_time_left()
+            if left is not None and left <= 0:
+                return  # out of time; the request itself fails on the boot deadline
+            if not waiting:
+                LOG.info(f"Waiting for a free node download slot for '{name}'...")
+                waiting = True
+            time.sleep(GOVERNOR_POLL_INTERVAL)
+
+    def sleep(self, delay: float) -> None:
+        """Sleep delay seconds before a retry, letting other boots use this thread's slot meanwhile."""
+        import fcntl
+        slots = getattr(self._in_slot, "slots", None)
+        if not slots:
+            time.sleep(delay)
+            return
+        for slot_file in slots:
+            fcntl.flock(slot_file, fcntl.LOCK_UN)
+        time.sleep(delay)
+        with self.waiting("slot"):
+            self.acquire(slots, self._in_slot.name)
+
+    def jitter(self) -> None:
+        # Once per boot, before its first request; other threads wait it out too.
+        import random
+        with self._jitter_lock:
+            if self.jittered or START_JITTER <= 0:
+                return
+            self.jittered = True
+            delay = random.uniform(0, START_JITTER)
+            left = network_time_left()
+            if left is not None:
+                delay = max(0.0, min(delay, left))
+            with self.waiting("jitter"):
+                time.sleep(delay)
+
+    def throttle(self, size: int) -> None:
+        """Pay for size bytes just received, sleeping while the node is over its rate."""
+        if not self.enabled or NODE_BANDWIDTH <= 0 or size <= 0:
+            return
+        try:
+            wait = self.reserve(size)
+        except OSError as e:
+            self.disable(e)
+            return
+        if wait > 0:
+            left = network_time_left()
+            with self.waiting("bandwidth"):
+                time.sleep(wait if left is None else max(0.0, min(wait, left)))
+
+    def reserve(self, size: int) -> float:
+        """Take size tokens from the node's bucket; returns the seconds to wait for them."""
+        import fcntl
+        burst = max(COPY_BUFSIZE, NODE_BANDWIDTH * NODE_BURST_SECONDS)
+        os.makedirs(GOVERNOR_DIR, exist_ok=True)
+        fd = os.open(os.path.join(GOVERNOR_DIR, "bucket"), os.O_RDWR | os.O_CREAT, 0o666)
+        with os.fdopen(fd, 'r+') as bucket:
+            fcntl.flock(bucket, fcntl.LOCK_EX)
+            # The monotonic clock is the kernel's, so it is shared by every container on the node.
+            now = time.monotonic()
+            try:
+                tokens, updated = (float(field) for field in bucket.read().split())
+            except ValueError:
+                tokens, updated = burst, now
+            if updated > now:
+                tokens, updated = burst, now  # written before the node rebooted
+            tokens = min(burst, tokens + (now - updated) * NODE_BANDWIDTH) - size
+            bucket.seek(0)
+            bucket.truncate()
+            bucket.write(f"{tokens:.0f} {now:.6f}")
+        return max(0.0, -tokens / NODE_BANDWIDTH)
+
+    def report(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            waited, total = dict(self.waited), self.held
+        PROFILER.metric("throttled_seconds", round(total, 3))
+        if total > 0:
+            LOG.info(f"Download governor held this boot back {total:.2f}s (summed over threads: start jitter "
+                     f"{waited['jitter']:.2f}s, slot waits {waited['slot']:.2f}s, bandwidth {waited['bandwidth']:.2f}s).")
+
+class BootLog:
+    """Leveled launcher log with batched console writes and an optional JSON-lines sink.
+
+    Console lines are buffered and written together once LOG_FLUSH_INTERVAL
+    has passed, the buffer fills or an error is logged, and always before
+    the child script starts, so whole lines from concurrent threads never
+    interleave and a boot costs a handful of writes. Until configure() is
+    called everything at info level and above is shown. Warnings and errors
+    are labelled as such on the console; the JSON lines carry the level.
+    """
+
+    DEBUG, INFO, WARNING, ERROR, SUMMARY = 10, 20, 30, 40, 50
+    LEVELS = {"debug": DEBUG, "normal": INFO, "quiet": WARNING}
+    NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error", SUMMARY: "summary"}
+    LABELS = {WARNING: "Warning: ", ERROR: "Error: "}
+
+    def __init__(self):
+        self.threshold = self.INFO
+        self.counts = dict.fromkeys(self.NAMES, 0)
+        self._sink = None
+        self._buffer = []
+        self._buffered = 0
+        self._timer = None
+        self._exit_hooked = False
+        self._lock = threading.Lock()
+
+    def configure(self, level: str, path: str = "") -> None:
+        if level not in self.LEVELS:
+            self.warning(f"Unknown log level '{level}', using 'normal'.")
+            level = "normal"
+        self.threshold = self.LEVELS[level]
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._sink = open(path, 'a', encoding='utf-8')
+            except OSError as e:
+                self.warning(f"Could not open log file '{path}': {e}")
+
+    def debug(self, message: str) -> None:
+        self.log(self.DEBUG, message)
+
+    def info(self, message: str) -> None:
+        self.log(self.INFO, message)
+
+    def warning(self, message: str) -> None:
+        self.log(self.WARNING, message)
+
+    def error(self, message: str) -> None:
+        self.log(self.ERROR, message)
+
+    def traceback(self) -> None:
+        import traceback
+        self.log(self.DEBUG, traceback.format_exc().rstrip())
+
+    def boot_summary(self, script_file: str) -> None:
+        problems = "".join(f", {self.counts[level]} {self.NAMES[level]}s"
+                           for level in (self.WARNING, self.ERROR) if self.counts[level])
+        if (throttled := GOVERNOR.throttled()) > 0:
+            problems += f", throttled {throttled:.2f}s"
+        self.log(self.SUMMARY, f"Boot finished in {PROFILER.elapsed():.2f}s (profile {LAUNCH_PROFILE}{problems}); "
+                               f"starting '{os.path.basename(script_file)}'.")
+
+    def log(self, level: int, message: str) -> None:
+        with self._lock:
+            self.counts[level] += 1
+            if self._sink is not None:
+                record = {"time": time.time(), "elapsed": round(PROFILER.elapsed(), 6), "level": self.NAMES[level],
+                          "thread": threading.current_thread().name, "message": message}
+                self._sink.write(json.dumps(record) + "\n")
+            if level < self.threshold:
+                return
+            # Summaries in normal mode would repeat what was just printed in full.
+            if level == self.SUMMARY and self.threshold != self.WARNING:
+                return
+            line = self.LABELS.get(level, "") + message + "\n"
+            self._buffer.append(line)
+            self._buffered += len(line)
+            flush_now = level >= self.ERROR or self._buffered >= LOG_BUFFER_LIMIT
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(LOG_FLUSH_INTERVAL, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            if not self._exit_hooked:
+                import atexit
+                atexit.register(self.flush)
+                self._exit_hooked = True
+        if flush_now:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            data = "".join(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._sink is not None:
+                self._sink.flush()
+            if data:
+                sys.stdout.write(data)
+                sys.stdout.flush()
+
+class BootProfiler:
+    """Collects monotonic boot-phase timings and writes them as a JSON report.
+
+    Every timestamp is in seconds since the launcher module was loaded. Nothing
+    is recorded unless the profiler is enabled with --profile or NOUR_PROFILE.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.monotonic()
+        self.phases = []
+        self.requests = []
+        self.fs_ops = []
+        self.marks = {}
+        self.metrics = {}
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append({"name": name, "start": start, "duration": self.elapsed() - start})
+
+    @contextlib.contextmanager
+    def fs_op(self, op: str, path: str):
+        if not self.enabled:
+            yield
+            return
+        start = self.elapsed()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.fs_ops.append({"op": op, "path": path, "start": start, "duration": self.elapsed() - start})
+
+    def record_request(self, url: str, status: int, timings: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self.requests.append(dict(timings, url=url, status=status, end=self.elapsed()))
+
+    def mark(self, name: str) -> None:
+        if self.enabled:
+            self.marks[name] = self.elapsed()
+
+    def metric(self, name: str, value) -> None:
+        if self.enabled:
+            self.metrics[name] = value
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "launcher": os.path.basename(sys.argv[0]),
+                "wall_clock_start": time.time() - self.elapsed(),
+                "marks": dict(self.marks),
+                "metrics": dict(self.metrics),
+                "phases": list(self.phases),
+                "requests": list(self.requests),
+                "fs_ops": list(self.fs_ops),
+                "totals": {
+                    "requests": len(self.requests),
+                    "bytes_received": sum(request.get("bytes", 0) for request in self.requests),
+                    "bytes_decoded": sum(request.get("decoded_bytes", request.get("bytes", 0)) for request in self.requests),
+                    "fs_ops": len(self.fs_ops),
+                    "fs_seconds": sum(op["duration"] for op in self.fs_ops),
+                },
+            }
+
+    def finish(self) -> None:
+        """Mark the child script start and write the report; later calls are no-ops."""
+        if not self.enabled or self.finished:
+            return
+        self.finished = True
+        self.mark("child_start")
+        report = self.report()
+        try:
+            os.makedirs(os.path.dirname(PROFILE_REPORT) or ".", exist_ok=True)
+            with open(PROFILE_REPORT, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+        except OSError as e:
+            LOG.warning(f"Could not write boot profile '{PROFILE_REPORT}': {e}")
+        phases = ", ".join(f"{phase['name']} {phase['duration']:.3f}s" for phase in report["phases"])
+        totals = report["totals"]
+        metrics = "".join(f", {name}={value}" for name, value in report["metrics"].items())
+        LOG.info(f"Boot profile: child start at {report['marks']['child_start']:.3f}s ({phases}); "
+              f"{totals['requests']} requests, {totals['bytes_received']} bytes on the wire "
+              f"({totals['bytes_decoded']} decoded), "
+              f"{totals['fs_ops']} fs ops in {totals['fs_seconds']:.3f}s{metrics} -> {PROFILE_REPORT}")
+
+PROFILER = BootProfiler()
+LOG = BootLog()
+GOVERNOR = NodeGovernor()
+BOOT_DEADLINE_AT = PROFILER.started + BOOT_DEADLINE if BOOT_DEADLINE > 0 else None
@@ -0,0 +1,234 @@
+"""Keep-alive HTTP(S) connection pool used for every launcher request.
+
+Imported on first use through launcher.core.open_url, which keeps ssl,
+http.client and urllib off the startup path when no request is made.
+"""
+import time
+import threading
+import socket
+import functools
+import ssl
+import http.client
+import urllib.request
+import urllib.error
+import urllib.parse
+
+from .core import COPY_BUFSIZE, USER_AGENT, PROFILER, network_timeouts
+
+class PooledHTTPResponse:
+    """File-like response that hands its keep-alive connection back to the pool on close."""
+
+    def __init__(self, pool, key, connection, response, url: str, timings: dict):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self._timings = timings
+        self._opened = time.monotonic()
+        self.url = url
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.msg
+        self.received = 0
+        self.decoded_bytes = None
+
+    def read(self, amt: int | None = None) -> bytes:
+        # A sized read is a single socket read, each bounded by what is left of the
+        # boot deadline, so a server trickling bytes cannot hold one read past it.
+        if amt is not None and self._connection is not None and self._connection.sock is not None:
+            self._connection.sock.settimeout(network_timeouts()[1])
+            data = self._response.read1(amt)
+        else:
+            data = self._response.read(amt)
+        self.received += len(data)
+        return data
+
+    def getcode(self) -> int:
+        return self.status
+
+    def close(self) -> None:
+        if self._connection is None:
+            return
+        response = self._response
+        # Drain short leftovers (redirect and 304 bodies) so the connection stays reusable.
+        if not response.isclosed() and response.length is not None and response.length <= COPY_BUFSIZE:
+            try:
+                response.read()
+            except (OSError, http.client.HTTPException):
+                pass
+        if response.isclosed() and not response.will_close:
+            self._pool.release(self._key, self._connection)
+        else:
+            self._connection.close()
+        self._connection = None
+        self._timings["transfer"] = time.monotonic() - self._opened
+        self._timings["bytes"] = self.received
+        if self.decoded_bytes is not None:
+            self._timings["decoded_bytes"] = self.decoded_bytes
+            self._timings["encoding"] = self.headers.get("Content-Encoding") or "xz"
+        PROFILER.record_request(self.url, self.status, self._timings)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def create_timed_connection(timings: dict, address, timeout=None, source_address=None):
+    """socket.create_connection that records DNS and TCP connect times into timings."""
+    host, port = address
+    started = time.monotonic()
+    addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    resolved = time.monotonic()
+    timings["dns"] = resolved - started
+    error = None
+    for family, sock_type, proto, _, sockaddr in addresses:
+        sock = socket.socket(family, sock_type, proto)
+        try:
+            if isinstance(timeout, (int, float)):
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            timings["connect"] = time.monotonic() - resolved
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f"getaddrinfo returned no addresses for {host}")
+
+class TimedHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, host: str, port: int | None, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.timings = {}
+        self._create_connection = functools.partial(create_timed_connection, self.timings)
+
+class SessionReusingHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection that resumes the last TLS session negotiated with its host."""
+
+    def __init__(self, host: str, port: int | None, pool, **kwargs):
+        super().__init__(host, port, context=pool.ssl_context, **kwargs)
+        self._pool = pool
+        self.timings = {}
+        self._create_connection = functools.partial(create_timed_connection, self.timings)
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        key = (self.host, self.port)
+        started = time.monotonic()
+        self.sock = self._pool.ssl_context.wrap_socket(
+            self.sock, server_hostname=self.host, session=self._pool.tls_session(key))
+        self.timings["tls"] = time.monotonic() - started
+        self.timings["tls_resumed"] = self.sock.session_reused
+
+class HTTPConnectionPool:
+    """Small per-host keep-alive pool shared by the update check and all downloads."""
+
+    def __init__(self, max_idle_per_host: int = 4, max_redirects: int = 10):
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.ssl_context = ssl.create_default_context()
+        self._idle = {}
+        self._tls_sessions = {}
+        self._lock = threading.Lock()
+
+    def tls_session(self, key):
+        with self._lock:
+            return self._tls_sessions.get(key)
+
+    def _connect(self, key):
+        scheme, host, port = key
+        if scheme == "https":
+            return SessionReusingHTTPSConnection(host, port, self)
+        return TimedHTTPConnection(host, port)
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(key), False
+
+    def release(self, key, connection) -> None:
+        sock = connection.sock
+        with self._lock:
+            if sock is not None and key[0] == "https" and getattr(sock, "session", None) is not None:
+                self._tls_sessions[(key[1], key[2])] = sock.session
+            idle = self._idle.setdefault(key, [])
+            if sock is not None and len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _send(self, key, path: str, headers: dict):
+        connection, reused = self._acquire(key)
+        try:
+            return self._exchange(connection, reused, path, headers)
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            if not reused:
+                raise
+
+        # The server dropped an idle keep-alive connection; retry once on a fresh one.
+        connection = self._connect(key)
+        try:
+            return self._exchange(connection, False, path, headers)
+        except BaseException:
+            connection.close()
+            raise
+
+    def _exchange(self, connection, reused: bool, path: str, headers: dict):
+        # Connecting (TLS included) is bounded by the connect timeout, every later socket read by the read timeout.
+        connect_timeout, read_timeout = network_timeouts()
+        connection.timeout = connect_timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(read_timeout)
+        started = time.monotonic()
+        connection.request("GET", path, headers=headers)
+        connection.sock.settimeout(read_timeout)
+        response = connection.getresponse()
+        timings = dict(connection.timings, reused=reused)
+        connection.timings.clear()
+        setup = sum(timings.get(phase, 0.0) for phase in ("dns", "connect", "tls"))
+        timings["ttfb"] = time.monotonic() - started - setup
+        return connection, response, timings
+
+    def urlopen(self, url: str, headers: dict | None = None) -> PooledHTTPResponse:
+        request_headers = {"User-Agent": USER_AGENT, "Accept-Encoding": "identity"}
+        request_headers.update(headers or {})
+        for _ in range(self.max_redirects + 1):
+            parsed = urllib.parse.urlsplit(url)
+            if parsed.scheme not in ("http", "https") or not parsed.hostname:
+                raise urllib.error.URLError(f"unsupported URL: {url}")
+            key = (parsed.scheme, parsed.hostname, parsed.port)
+            path = urllib.parse.urlunsplit(("", "", parsed.path or "/", parsed.query, ""))
+            try:
+                connection, response, timings = self._send(key, path, request_headers)
+            except (OSError, http.client.HTTPException) as e:
+                raise urllib.error.URLError(e) from e
+            pooled = PooledHTTPResponse(self, key, connection, response, url, timings)
+
+            location = response.getheader("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                pooled.close()
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if response.status >= 300:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.msg, pooled)
+            return pooled
+        raise urllib.error.URLError(f"too many redirects while fetching {url}")
+
+def open_url(url: str, headers: dict | None = None):
+    # Requests that must go through a configured proxy keep using urllib.
+    if urllib.parse.urlsplit(url).scheme in urllib.request.getproxies():
+        return urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=network_timeouts()[1])
+    return HTTP_POOL.urlopen(url, headers)
+
+HTTP_POOL = HTTPConnectionPool()
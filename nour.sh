@@ -11,8 +11,11 @@ SYSTEMCTL_BIN="${HOME}/usr/local/bin/systemctl"
 DEP_FLAG="${HOME}/.deps"
 
 export PATH="${LOCAL_BIN}:${HOME}/.local/usr/bin:${HOME}/usr/local/bin:${PATH}"
-mkdir -p "$LOCAL_BIN" "${HOME}/usr/local/bin"
+[[ "${NOUR_BOOT_TREE_READY:-}" == "1" ]] || mkdir -p "$LOCAL_BIN" "${HOME}/usr/local/bin"
 
+# Every download goes to a .part file that is renamed over its destination:
+# the launcher installs these paths as symlinks into its versioned boot sets,
+# and writing through such a link would change every version sharing the file.
 setup_tools() {
     echo -e "${B}Checking system architecture...${NC}"
     ARCH=$(uname -m)
@@ -33,13 +36,14 @@ setup_tools() {
 
     echo -e "${Y}Installing BusyBox 1.35.0...${NC}"
     if command -v wget >/dev/null 2>&1; then
-        wget -q "$BBOX_URL" -O "${LOCAL_BIN}/busybox"
+        wget -q "$BBOX_URL" -O "${LOCAL_BIN}/busybox.part"
     elif command -v curl >/dev/null 2>&1; then
-        curl -sSL "$BBOX_URL" -o "${LOCAL_BIN}/busybox"
+        curl -sSL "$BBOX_URL" -o "${LOCAL_BIN}/busybox.part"
     else
         echo -e "${R}Error: Neither wget nor curl found to download initial tools.${NC}"
         exit 1
     fi
+    mv -f "${LOCAL_BIN}/busybox.part" "${LOCAL_BIN}/busybox"
     chmod +x "${LOCAL_BIN}/busybox"
     
     for tool in xz tar unxz gzip bzip2 bash ip wget; do
@@ -47,7 +51,7 @@ setup_tools() {
     done
 
     echo -e "${Y}Installing static jq...${NC}"
-    "${LOCAL_BIN}/wget" -q "$JQ_URL" -O "${LOCAL_BIN}/jq"
+    "${LOCAL_BIN}/wget" -q "$JQ_URL" -O "${LOCAL_BIN}/jq.part" && mv -f "${LOCAL_BIN}/jq.part" "${LOCAL_BIN}/jq"
     chmod +x "${LOCAL_BIN}/jq"
 
     touch "$DEP_FLAG"
@@ -57,7 +61,8 @@ check_proot() {
     if [ ! -f "$PROOT_BIN" ]; then
         echo -e "${Y}PRoot not found. Downloading PRoot engine...${NC}"
         local ARCH=$(uname -m)
-        wget -q "https://github.com/ysdragon/proot-static/releases/latest/download/proot-${ARCH}-static" -O "$PROOT_BIN"
+        wget -q "https://github.com/ysdragon/proot-static/releases/latest/download/proot-${ARCH}-static" -O "${PROOT_BIN}.part" &&
+            mv -f "${PROOT_BIN}.part" "$PROOT_BIN"
         chmod +x "$PROOT_BIN"
     else
         echo -e "${G}PRoot is already downloaded and ready.${NC}"
@@ -67,7 +72,8 @@ check_proot() {
 check_systemctl() {
     if [ ! -f "$SYSTEMCTL_BIN" ]; then
         echo -e "${Y}systemctl not found. Downloading systemctl replacement...${NC}"
-        wget -q "https://raw.githubusercontent.com/gdraheim/docker-systemctl-replacement/refs/heads/master/files/docker/systemctl3.py" -O "$SYSTEMCTL_BIN"
+        wget -q "https://raw.githubusercontent.com/gdraheim/docker-systemctl-replacement/refs/heads/master/files/docker/systemctl3.py" -O "${SYSTEMCTL_BIN}.part" &&
+            mv -f "${SYSTEMCTL_BIN}.part" "$SYSTEMCTL_BIN"
         chmod +x "$SYSTEMCTL_BIN"
     else
         echo -e "${G}systemctl is already downloaded and ready.${NC}"
@@ -90,27 +96,35 @@ sync_scripts() {
 
     for path in "${!scripts[@]}"; do
         mkdir -p "$(dirname "${HOME}/${path}")"
-        wget -q "${scripts[$path]}" -O "${HOME}/${path}"
+        wget -q "${scripts[$path]}" -O "${HOME}/${path}.part" && mv -f "${HOME}/${path}.part" "${HOME}/${path}"
         chmod +x "${HOME}/${path}"
     done
 }
 
 cd "${HOME}"
-[[ -f "$DEP_FLAG" ]] || setup_tools
 
-# Check for proot and systemctl every time the script runs
-check_proot
-check_systemctl
+# The Python launcher fetches the whole boot set in parallel and sets
+# NOUR_BOOT_TREE_READY=1 once everything below is already in place.
+if [[ "${NOUR_BOOT_TREE_READY:-}" == "1" ]]; then
+    echo -e "${G}Boot tree prepared by the launcher.${NC}"
+else
+    [[ -f "$DEP_FLAG" ]] || setup_tools
+
+    # Check for proot and systemctl every time the script runs
+    check_proot
+    check_systemctl
 
-sync_scripts
+    sync_scripts
+fi
 
-if [ -f "${HOME}/server.jar" ]; then
+if [ -f "${HOME}/server.jar" ] && [ ! -x "${HOME}/server.jar" ]; then
     chmod +x "${HOME}/server.jar"
 fi
 
 if [[ -f "${HOME}/entrypoint.sh" ]]; then
     echo -e "${G}Booting...${NC}"
-    export server_ip=$(wget -qO- api.ipify.org)
+    # The launcher passes server_ip in; look it up only when run on its own.
+    export server_ip="${server_ip:-$(wget -T 5 -qO- api.ipify.org)}"
     exec /bin/sh "${HOME}/entrypoint.sh"
 else
     echo -e "${R}Error: entrypoint.sh missing.${NC}"; exit 1
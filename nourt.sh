@@ -95,7 +95,8 @@ fi
 
 if [[ -f "${HOME}/entrypoint.sh" ]]; then
     echo -e "${G}Booting...${NC}"
-    export server_ip=$(wget -qO- checkip.pterodactyl-installer.se)
+    # The launcher passes server_ip in; look it up only when run on its own.
+    export server_ip="${server_ip:-$(wget -T 5 -qO- checkip.pterodactyl-installer.se)}"
     exec /bin/sh "${HOME}/entrypoint.sh"
 else
     echo -e "${R}Error: entrypoint.sh missing.${NC}"; exit 1